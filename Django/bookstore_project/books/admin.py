@@ -1,7 +1,8 @@
 from django.contrib import admin
-from .models import Book, Category, Order, OrderItem
+from .models import Book, Category, DailySales, Order, OrderItem
 
 admin.site.register(Book)
 admin.site.register(Category)
 admin.site.register(Order)
-admin.site.register(OrderItem)
\ No newline at end of file
+admin.site.register(OrderItem)
+admin.site.register(DailySales)
\ No newline at end of file
@@ -0,0 +1,131 @@
+from decimal import Decimal
+
+from .models import Book
+
+CART_SESSION_KEY = 'cart'
+
+
+def session_quantities(session):
+    """Return {book pk: quantity} from the session cart, skipping malformed entries."""
+    quantities = {}
+    for pk, item in session.get(CART_SESSION_KEY, {}).items():
+        # Carts written before the compact format stored a dict per book
+        if isinstance(item, dict):
+            item = item.get('quantity', 0)
+        try:
+            pk, quantity = int(pk), int(item)
+        except (TypeError, ValueError):
+            continue
+        if quantity > 0:
+            quantities[pk] = quantity
+    return quantities
+
+
+def add_to_session(session, pk, quantity=1):
+    """Store only pk -> quantity; titles and prices are resolved when the cart is rendered."""
+    quantities = session_quantities(session)
+    quantities[pk] = quantities.get(pk, 0) + quantity
+    session[CART_SESSION_KEY] = {str(pk): qty for pk, qty in quantities.items() if qty > 0}
+
+
+def load_books(pks):
+    pks = list(pks)
+    return Book.objects.only('title', 'price', 'category_id').in_bulk(pks) if pks else {}
+
+
+def apply_changes(session, changes):
+    """
+    Apply a batch of {pk: quantity delta} changes to the session cart.
+
+    Every pk is validated, and the resulting cart resolved, with one query.
+    Returns (cart, unknown_pks); nothing is written if any pk is unknown.
+    """
+    quantities = session_quantities(session)
+    books = load_books(set(quantities) | set(changes))
+    unknown = sorted(pk for pk in changes if pk not in books)
+    if unknown:
+        return None, unknown
+    for pk, delta in changes.items():
+        quantities[pk] = quantities.get(pk, 0) + delta
+    quantities = {pk: qty for pk, qty in quantities.items() if qty > 0 and pk in books}
+    session[CART_SESSION_KEY] = {str(pk): qty for pk, qty in quantities.items()}
+    return Cart.from_books(quantities, books), []
+
+
+class CartLine:
+    def __init__(self, book, quantity):
+        self.book = book
+        self.quantity = quantity
+        self.price = book.price
+
+    @property
+    def total_price(self):
+        return self.price * self.quantity
+
+
+class Cart:
+    """The session cart resolved against the database in a single query."""
+
+    def __init__(self, lines, missing):
+        self.lines = lines
+        self.missing = missing
+
+    @classmethod
+    def from_session(cls, session):
+        quantities = session_quantities(session)
+        return cls.from_books(quantities, load_books(quantities))
+
+    @classmethod
+    def from_books(cls, quantities, books):
+        lines = [CartLine(books[pk], quantity) for pk, quantity in quantities.items() if pk in books]
+        missing = [pk for pk in quantities if pk not in books]
+        return cls(lines, missing)
+
+    def as_dict(self):
+        return {
+            'items': [
+                {
+                    'pk': line.book.pk,
+                    'title': line.book.title,
+                    'quantity': line.quantity,
+                    'price': str(line.price),
+                    'total_price': str(line.total_price),
+                }
+                for line in self.lines
+            ],
+            'item_count': self.item_count,
+            'total': str(self.total),
+        }
+
+    def __iter__(self):
+        return iter(self.lines)
+
+    def __len__(self):
+        return len(self.lines)
+
+    def __bool__(self):
+        return bool(self.lines)
+
+    @property
+    def total(self):
+        return sum((line.total_price for line in self.lines), Decimal('0.00'))
+
+    @property
+    def item_count(self):
+        return sum(line.quantity for line in self.lines)
+
+    def prune_missing(self, session):
+        """Drop books that no longer exist from the session cart."""
+        if not self.missing:
+            return
+        cart = session.get(CART_SESSION_KEY, {})
+        for pk in self.missing:
+            cart.pop(str(pk), None)
+        session[CART_SESSION_KEY] = cart
+
+
+def get_cart(request):
+    # Memoised so every consumer within one request shares the same query
+    if not hasattr(request, '_books_cart'):
+        request._books_cart = Cart.from_session(request.session)
+    return request._books_cart
@@ -0,0 +1,128 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+CATALOG_VERSION_KEY = 'catalog:version'
+HITS_KEY = 'catalog:stats:hits'
+MISSES_KEY = 'catalog:stats:misses'
+
+_MISSING = object()
+
+
+def get_cache():
+    return caches[getattr(settings, 'CATALOG_CACHE_ALIAS', 'default')]
+
+
+def category_version_key(category_id):
+    return f'catalog:category:{category_id}:version'
+
+
+def book_key(pk):
+    return f'catalog:book:{pk}'
+
+
+def _fresh_version():
+    # Seeding from the clock means an evicted counter never restarts at a value
+    # that old entries were stored under.
+    return int(time.time() * 1000)
+
+
+def get_versions(*keys):
+    cache = get_cache()
+    versions = cache.get_many(keys)
+    missing = {key: _fresh_version() for key in keys if key not in versions}
+    if missing:
+        for key, value in missing.items():
+            cache.add(key, value, timeout=None)
+        versions.update(cache.get_many(missing))
+    return [versions[key] for key in keys]
+
+
+def _bump(cache, key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, _fresh_version(), timeout=None)
+
+
+def bump_category(*category_ids):
+    """Invalidate everything cached for these categories and every cross-category page."""
+    cache = get_cache()
+    for category_id in set(category_ids):
+        if category_id is not None:
+            _bump(cache, category_version_key(category_id))
+    _bump(cache, CATALOG_VERSION_KEY)
+
+
+def bump_catalog():
+    _bump(get_cache(), CATALOG_VERSION_KEY)
+
+
+def forget_book(pk):
+    get_cache().delete(book_key(pk))
+
+
+def forget_books(pks):
+    get_cache().delete_many([book_key(pk) for pk in pks])
+
+
+def _record(key):
+    cache = get_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, timeout=None)
+
+
+def stats():
+    counts = get_cache().get_many([HITS_KEY, MISSES_KEY])
+    hits, misses = counts.get(HITS_KEY, 0), counts.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_ratio': hits / total if total else 0.0}
+
+
+def cached_catalog_read(name, params, compute):
+    """Cache a cross-category read (list pages, search results) under the catalog version."""
+    cache = get_cache()
+    (version,) = get_versions(CATALOG_VERSION_KEY)
+    digest = hashlib.md5(repr(params).encode()).hexdigest()
+    key = f'catalog:{name}:{version}:{digest}'
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        _record(HITS_KEY)
+        return value
+    _record(MISSES_KEY)
+    value = compute()
+    cache.set(key, value, getattr(settings, 'CATALOG_CACHE_TIMEOUT', 600))
+    return value
+
+
+def cached_book(pk, compute, category_of):
+    """
+    Cache one book, validated against its category's version so a category
+    rename invalidates every detail page in that category.
+
+    On a miss, ``category_of()`` looks up the book's category id so its
+    version is read before ``compute()`` runs: a rename committing in between
+    then leaves the entry already stale instead of caching the old name under
+    the new version.
+    """
+    cache = get_cache()
+    entry = cache.get(book_key(pk))
+    if entry is not None:
+        category_id, version, book = entry
+        if get_versions(category_version_key(category_id)) == [version]:
+            _record(HITS_KEY)
+            return book
+    _record(MISSES_KEY)
+    category_id = category_of()
+    if category_id is None:
+        return compute()
+    (version,) = get_versions(category_version_key(category_id))
+    book = compute()
+    # A book that moved category meanwhile is left for the next read
+    if book.category_id == category_id:
+        cache.set(book_key(pk), (category_id, version, book), getattr(settings, 'CATALOG_CACHE_TIMEOUT', 600))
+    return book
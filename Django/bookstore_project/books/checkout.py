@@ -0,0 +1,47 @@
+import uuid
+
+from django.db import IntegrityError, transaction
+
+from .models import Order, OrderItem
+from .reports import record_order
+
+CHECKOUT_TOKEN_SESSION_KEY = 'checkout_token'
+
+
+def get_checkout_token(session):
+    """Return the idempotency token for the cart currently in the session."""
+    token = session.get(CHECKOUT_TOKEN_SESSION_KEY)
+    if not token:
+        token = session[CHECKOUT_TOKEN_SESSION_KEY] = str(uuid.uuid4())
+    return token
+
+
+def parse_checkout_token(value):
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        return None
+
+
+def place_order(user, cart, token):
+    """
+    Turn a resolved cart into an order with a fixed number of queries.
+
+    Returns (order, created). A token that already produced an order returns
+    that order instead of creating a second one, including when two requests
+    race on the same token.
+    """
+    existing = Order.objects.filter(user=user, checkout_token=token).first()
+    if existing:
+        return existing, False
+    try:
+        with transaction.atomic():
+            order = Order.objects.create(user=user, total_price=cart.total, checkout_token=token)
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, book=line.book, quantity=line.quantity, price=line.price)
+                for line in cart
+            ])
+            record_order(order, cart)
+    except IntegrityError:
+        return Order.objects.get(user=user, checkout_token=token), False
+    return order, True
@@ -0,0 +1,106 @@
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Rendition name -> maximum width in pixels
+RENDITIONS = {
+    'thumbnail': 120,
+    'list': 240,
+    'detail': 480,
+}
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+UPLOAD_DIR = 'covers'
+
+_executor = None
+
+
+def _encode(image, fmt):
+    pil_format, options = FORMATS[fmt]
+    buffer = BytesIO()
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def _store(data, ext, storage):
+    # Named after the content so the URL never changes meaning and can be cached forever
+    name = f'{UPLOAD_DIR}/{hashlib.sha256(data).hexdigest()[:24]}.{ext}'
+    if not storage.exists(name):
+        storage.save(name, ContentFile(data))
+    return name
+
+
+def generate_renditions(name, storage=None):
+    """Render every size and format of the cover stored at `name`."""
+    storage = storage or default_storage
+    with storage.open(name, 'rb') as source:
+        image = Image.open(source)
+        image = ImageOps.exif_transpose(image).convert('RGB')
+
+    renditions = {'source': name}
+    for rendition, max_width in RENDITIONS.items():
+        resized = image.copy()
+        if resized.width > max_width:
+            height = round(resized.height * max_width / resized.width)
+            resized = resized.resize((max_width, height), Image.LANCZOS)
+        entry = {'width': resized.width, 'height': resized.height}
+        for fmt in FORMATS:
+            entry[fmt] = _store(_encode(resized, fmt), 'jpg' if fmt == 'jpeg' else fmt, storage)
+        renditions[rendition] = entry
+    return renditions
+
+
+def process_cover(pk, name):
+    from .catalog import forget_book
+    from .models import Book
+
+    try:
+        renditions = generate_renditions(name)
+    except Exception:
+        logger.exception('Could not render cover %s for book %s', name, pk)
+        return
+    # Skip the write if a newer upload replaced the cover in the meantime
+    if Book.objects.filter(pk=pk, cover_image=name).update(cover_renditions=renditions):
+        forget_book(pk)
+
+
+def _run_in_background(pk, name):
+    try:
+        process_cover(pk, name)
+    finally:
+        # Worker threads hold their own connection; don't leave it open between jobs
+        connection.close()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'COVER_RENDITION_WORKERS', 2),
+            thread_name_prefix='cover-renditions',
+        )
+    return _executor
+
+
+def needs_renditions(book):
+    return bool(book.cover_image) and book.cover_renditions.get('source') != book.cover_image.name
+
+
+def schedule_renditions(book):
+    """Queue rendition work for after the surrounding transaction commits."""
+    pk, name = book.pk, book.cover_image.name
+    if getattr(settings, 'COVER_RENDITIONS_ASYNC', True):
+        transaction.on_commit(lambda: get_executor().submit(_run_in_background, pk, name))
+    else:
+        transaction.on_commit(lambda: process_cover(pk, name))
@@ -0,0 +1,231 @@
+"""
+Seed a throwaway bookstore database and drive it with concurrent test clients.
+
+Used by ``manage.py bench_bookstore``; kept separate so the pieces can be reused
+from a shell or a test.
+"""
+import json
+import platform
+import random
+import re
+import statistics
+import subprocess
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .models import Book, Category, Order, OrderItem
+from .reports import rebuild_daily_sales
+from .search import get_backend
+
+PRESETS = {
+    'small': {'books': 1_000, 'categories': 20, 'users': 50, 'orders': 500},
+    'medium': {'books': 100_000, 'categories': 200, 'users': 1_000, 'orders': 20_000},
+    'large': {'books': 1_000_000, 'categories': 1_000, 'users': 10_000, 'orders': 200_000},
+}
+SCENARIOS = ('list', 'detail', 'search', 'add_to_cart', 'cart', 'checkout', 'order_history')
+WORDS = ('river', 'night', 'glass', 'empire', 'garden', 'winter', 'silent', 'crown', 'ocean', 'shadow',
+         'letters', 'summer', 'iron', 'harbor', 'stone', 'memory', 'forest', 'signal', 'paper', 'light')
+TOKEN_RE = re.compile(r'name="checkout_token" value="([^"]+)"')
+PASSWORD = 'loadtest-password'
+
+
+def _batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def book_range():
+    pks = Book.objects.order_by('pk').values_list('pk', flat=True)
+    return pks.first(), pks.last()
+
+
+def seed(books, categories, users, orders, batch_size=5000, rng=None, log=print):
+    """Bulk-insert a synthetic catalog, users and order history."""
+    rng = rng or random.Random(0)
+    started = time.perf_counter()
+    with transaction.atomic():
+        Category.objects.bulk_create([Category(name=f'Category {i}') for i in range(categories)])
+        category_ids = list(Category.objects.values_list('pk', flat=True))
+
+        book_rows = (
+            Book(
+                title=' '.join(rng.choice(WORDS).title() for _ in range(3)) + f' {i}',
+                author=f'{rng.choice(WORDS).title()} {rng.choice(WORDS).title()}',
+                isbn=f'{9_780_000_000_000 + i}',
+                price=Decimal(rng.randint(299, 4999)) / 100,
+                cover_image='',
+                category_id=rng.choice(category_ids),
+            )
+            for i in range(books)
+        )
+        for batch in _batches(book_rows, batch_size):
+            Book.objects.bulk_create(batch)
+        log(f'  {books} books in {time.perf_counter() - started:.1f}s')
+
+        password = make_password(PASSWORD)
+        User.objects.bulk_create(
+            [User(username=f'loadtest{i}', password=password) for i in range(users)],
+            batch_size=batch_size,
+        )
+        user_ids = list(User.objects.filter(username__startswith='loadtest').values_list('pk', flat=True))
+
+        first_book, last_book = book_range()
+        prices = dict(Book.objects.values_list('pk', 'price')) if books <= 100_000 else None
+        for batch in _batches(range(orders), batch_size):
+            order_objs, lines = [], []
+            for _ in batch:
+                items = []
+                for _ in range(rng.randint(1, 5)):
+                    pk = rng.randint(first_book, last_book)
+                    price = prices[pk] if prices else Decimal('9.99')
+                    items.append(OrderItem(book_id=pk, quantity=rng.randint(1, 3), price=price))
+                total = sum(item.price * item.quantity for item in items)
+                order_objs.append(Order(user_id=rng.choice(user_ids), total_price=total))
+                lines.append(items)
+            Order.objects.bulk_create(order_objs)
+            for order, items in zip(order_objs, lines):
+                for item in items:
+                    item.order = order
+            OrderItem.objects.bulk_create([item for items in lines for item in items], batch_size=batch_size)
+        log(f'  {users} users, {orders} orders in {time.perf_counter() - started:.1f}s')
+
+        get_backend().rebuild()
+        rebuild_daily_sales()
+    log(f'Seeded in {time.perf_counter() - started:.1f}s')
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, scenario, seconds, queries, ok):
+        with self.lock:
+            self.samples[scenario].append((seconds, queries))
+            if not ok:
+                self.errors[scenario] += 1
+
+
+def _timed(recorder, scenario, call):
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        response = call()
+        elapsed = time.perf_counter() - started
+    recorder.record(scenario, elapsed, len(queries), response.status_code < 400)
+    return response
+
+
+def _journey(client, recorder, rng, books):
+    first, last = books
+    pks = [rng.randint(first, last) for _ in range(3)]
+    _timed(recorder, 'list', lambda: client.get(reverse('book_list')))
+    _timed(recorder, 'detail', lambda: client.get(reverse('book_detail', args=[pks[0]])))
+    _timed(recorder, 'search', lambda: client.get(reverse('book_search'), {'q': rng.choice(WORDS)}))
+    _timed(recorder, 'add_to_cart', lambda: client.post(
+        reverse('cart_api'), json.dumps({'items': {str(pk): 1 for pk in pks}}), content_type='application/json',
+    ))
+    cart_page = _timed(recorder, 'cart', lambda: client.get(reverse('cart_detail')))
+    match = TOKEN_RE.search(cart_page.content.decode())
+    if match:
+        _timed(recorder, 'checkout', lambda: client.post(reverse('checkout'), {'checkout_token': match.group(1)}))
+    _timed(recorder, 'order_history', lambda: client.get(reverse('order_history')))
+
+
+def drive(concurrency, iterations, seed_value=0):
+    """Run `iterations` shopping journeys on each of `concurrency` threads."""
+    caches['default'].clear()
+    users = list(User.objects.filter(username__startswith='loadtest').order_by('pk')[:concurrency])
+    if len(users) < concurrency:
+        raise ValueError(f'Need at least {concurrency} seeded users, found {len(users)}.')
+    books = book_range()
+    recorder = Recorder()
+    failures = []
+
+    def worker(index, user):
+        rng = random.Random(seed_value + index)
+        client = Client()
+        client.force_login(user)
+        try:
+            for _ in range(iterations):
+                _journey(client, recorder, rng, books)
+        except Exception as exc:
+            failures.append(repr(exc))
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(i, user)) for i, user in enumerate(users)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    return summarize(recorder, wall, failures)
+
+
+def _percentile(cuts, p):
+    return round(cuts[p - 1] * 1000, 2)
+
+
+def summarize(recorder, wall, failures):
+    scenarios = {}
+    total = 0
+    for scenario in SCENARIOS:
+        samples = recorder.samples.get(scenario)
+        if not samples:
+            continue
+        latencies = [seconds for seconds, _ in samples]
+        cuts = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else latencies * 99
+        scenarios[scenario] = {
+            'requests': len(samples),
+            'errors': recorder.errors.get(scenario, 0),
+            'p50_ms': _percentile(cuts, 50),
+            'p95_ms': _percentile(cuts, 95),
+            'p99_ms': _percentile(cuts, 99),
+            'queries_per_request': round(statistics.mean(q for _, q in samples), 2),
+            'max_queries': max(q for _, q in samples),
+        }
+        total += len(samples)
+    return {
+        'wall_seconds': round(wall, 3),
+        'requests': total,
+        'throughput_rps': round(total / wall, 1) if wall else 0,
+        'scenarios': scenarios,
+        'failures': failures,
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'timestamp': datetime.now(dt_timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+    }
@@ -0,0 +1,74 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from books.catalog import forget_book
+from books.covers import generate_renditions
+from books.models import Book
+
+
+def _init_worker():
+    # Spawned workers (macOS/Windows) start without configured settings
+    django.setup()
+
+
+def _render(pk, name):
+    try:
+        return pk, name, generate_renditions(name), None
+    except Exception as exc:
+        return pk, name, None, str(exc)
+
+
+class Command(BaseCommand):
+    help = 'Generate cover renditions for books that are missing them, using a process pool.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--batch-size', type=int, default=200,
+                            help='Number of finished books written back per UPDATE batch.')
+        parser.add_argument('--force', action='store_true', help='Re-render covers that already have renditions.')
+
+    def handle(self, *args, **options):
+        pending = [
+            (pk, name)
+            for pk, name, renditions in Book.objects.exclude(cover_image='')
+            .values_list('pk', 'cover_image', 'cover_renditions').iterator()
+            if options['force'] or (renditions or {}).get('source') != name
+        ]
+        if not pending:
+            self.stdout.write('All covers already have renditions.')
+            return
+
+        # Forked workers must not share the parent's database connection
+        connections.close_all()
+        started = time.perf_counter()
+        done, failed, batch = 0, 0, []
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker) as pool:
+            futures = [pool.submit(_render, pk, name) for pk, name in pending]
+            for future in as_completed(futures):
+                pk, name, renditions, error = future.result()
+                if error:
+                    failed += 1
+                    self.stderr.write(f'Book {pk} ({name}): {error}')
+                    continue
+                batch.append(Book(pk=pk, cover_image=name, cover_renditions=renditions))
+                if len(batch) >= options['batch_size']:
+                    done += self._save(batch)
+                    batch = []
+        done += self._save(batch)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Rendered {done} covers in {elapsed:.1f}s ({failed} failed).'
+        ))
+
+    def _save(self, books):
+        # bulk_update skips post_save, so this cannot re-trigger the upload signal
+        Book.objects.bulk_update(books, ['cover_renditions'])
+        for book in books:
+            forget_book(book.pk)
+        return len(books)
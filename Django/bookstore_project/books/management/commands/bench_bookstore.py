@@ -0,0 +1,73 @@
+import json
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from books import loadtest
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway database and measure latency, queries per request and throughput '
+        'of the main bookstore pages under concurrent clients.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--preset', choices=sorted(loadtest.PRESETS), default='small')
+        for name in ('books', 'categories', 'users', 'orders'):
+            parser.add_argument(f'--{name}', type=int, help=f'Override the preset number of {name}.')
+        parser.add_argument('--concurrency', type=int, default=8, help='Number of concurrent clients.')
+        parser.add_argument('--iterations', type=int, default=5, help='Shopping journeys per client.')
+        parser.add_argument('--output', default='bench_results.json', help='Where to write the JSON results.')
+        parser.add_argument('--db-path', help='SQLite file for the benchmark database (default: a temp file).')
+
+    def handle(self, *args, **options):
+        sizes = dict(loadtest.PRESETS[options['preset']])
+        for name in sizes:
+            if options[name] is not None:
+                sizes[name] = options[name]
+        if options['concurrency'] > sizes['users']:
+            raise CommandError('--concurrency cannot exceed the number of seeded users.')
+
+        temp_dir = None
+        if connection.vendor == 'sqlite':
+            # A file rather than the in-memory test database, so writer threads wait on locks instead of failing
+            if not options['db_path']:
+                temp_dir = tempfile.mkdtemp()
+            connection.settings_dict['TEST']['NAME'] = options['db_path'] or os.path.join(temp_dir, 'bench.sqlite3')
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.stdout.write(f"Seeding {sizes}...")
+            loadtest.seed(**sizes, log=self.stdout.write)
+            self.stdout.write(f"Driving {options['concurrency']} clients x {options['iterations']} journeys...")
+            results = loadtest.drive(options['concurrency'], options['iterations'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            if temp_dir:
+                os.rmdir(temp_dir)
+
+        report = {
+            'environment': loadtest.environment(),
+            'config': {**sizes, 'concurrency': options['concurrency'], 'iterations': options['iterations']},
+            **results,
+        }
+        with open(options['output'], 'w', encoding='utf-8') as output:
+            json.dump(report, output, indent=2)
+
+        self.stdout.write(f"{'scenario':<15}{'requests':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}")
+        for scenario, row in results['scenarios'].items():
+            self.stdout.write(
+                f"{scenario:<15}{row['requests']:>9}{row['p50_ms']:>9}{row['p95_ms']:>9}"
+                f"{row['p99_ms']:>9}{row['queries_per_request']:>9}"
+            )
+        for failure in results['failures']:
+            self.stderr.write(failure)
+        self.stdout.write(self.style.SUCCESS(
+            f"{results['requests']} requests at {results['throughput_rps']} req/s; wrote {options['output']}"
+        ))
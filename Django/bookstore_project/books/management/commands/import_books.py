@@ -0,0 +1,147 @@
+import csv
+import json
+import sys
+import time
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from books import catalog
+from books.models import Book, Category
+from books.search import get_backend
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+FIELDS = ('title', 'author', 'isbn', 'price', 'category')
+MAX_PRICE = Decimal('999.99')
+
+
+def peak_memory_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes everywhere else
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def read_csv(stream):
+    yield from csv.DictReader(stream)
+
+
+def read_jsonl(stream):
+    for line in stream:
+        line = line.strip()
+        if line:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # Counted as a skipped row, like a CSV row clean() rejects
+                yield None
+
+
+class Command(BaseCommand):
+    help = 'Stream a CSV or JSONL supplier feed into the catalog, upserting books by ISBN.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Feed file, or '-' for stdin.")
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='Feed format; guessed from the file extension when omitted.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+
+        self.category_ids = {}
+        self.imported = self.skipped = 0
+        started = time.perf_counter()
+
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        try:
+            rows = read_jsonl(stream) if fmt == 'jsonl' else read_csv(stream)
+            while True:
+                batch = list(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                self.import_batch(batch)
+                if options['verbosity'] > 1:
+                    self.stdout.write(self.summary(started))
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        catalog.bump_category(*self.category_ids.values())
+        self.stdout.write(self.style.SUCCESS(self.summary(started)))
+
+    def clean(self, row):
+        try:
+            values = {field: str(row[field]).strip() for field in FIELDS}
+            values['isbn'] = values['isbn'].replace('-', '')
+            values['price'] = Decimal(values['price']).quantize(Decimal('0.01'))
+            # NaN survives quantize, then raises when compared below
+            if not values['price'].is_finite():
+                return None
+        except (KeyError, TypeError, InvalidOperation):
+            # TypeError: a JSONL line that was not an object, or did not parse
+            return None
+        if not all(values[field] for field in ('title', 'isbn', 'category')):
+            return None
+        if len(values['isbn']) > 13 or max(len(values[f]) for f in ('title', 'author', 'category')) > 100:
+            return None
+        if not Decimal(0) <= values['price'] <= MAX_PRICE:
+            return None
+        values['cover_image'] = str(row.get('cover_image') or '')
+        return values
+
+    def resolve_categories(self, names):
+        unknown = set(names) - self.category_ids.keys()
+        if not unknown:
+            return
+        self.category_ids.update(Category.objects.filter(name__in=unknown).values_list('name', 'pk'))
+        missing = unknown - self.category_ids.keys()
+        if missing:
+            Category.objects.bulk_create([Category(name=name) for name in missing])
+            self.category_ids.update(Category.objects.filter(name__in=missing).values_list('name', 'pk'))
+
+    def import_batch(self, rows):
+        books = {}
+        for row in rows:
+            values = self.clean(row)
+            if values is None:
+                self.skipped += 1
+                continue
+            # Last occurrence wins; one statement cannot upsert the same ISBN twice
+            books[values['isbn']] = values
+
+        with transaction.atomic():
+            self.resolve_categories({values['category'] for values in books.values()})
+            Book.objects.bulk_create(
+                [
+                    Book(title=v['title'], author=v['author'], isbn=v['isbn'], price=v['price'],
+                         cover_image=v['cover_image'], category_id=self.category_ids[v['category']])
+                    for v in books.values()
+                ],
+                update_conflicts=True,
+                unique_fields=['isbn'],
+                update_fields=['title', 'author', 'price', 'category'],
+            )
+            # bulk_create skips model signals, so keep the search index in step here
+            pks = list(Book.objects.filter(isbn__in=books).values_list('pk', flat=True))
+            get_backend().index_books(pks)
+        catalog.forget_books(pks)
+        self.imported += len(books)
+
+    def summary(self, started):
+        elapsed = time.perf_counter() - started
+        rate = self.imported / elapsed if elapsed else 0
+        peak = peak_memory_mb()
+        memory = f', peak RSS {peak:.0f} MB' if peak is not None else ''
+        return f'{self.imported} books upserted, {self.skipped} rows skipped, {rate:,.0f} rows/s{memory}'
+
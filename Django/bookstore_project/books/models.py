@@ -10,11 +10,17 @@ class Category(models.Model):
 class Book(models.Model):
     title = models.CharField(max_length=100)
     author = models.CharField(max_length=100)
-    isbn = models.CharField(max_length=13)
+    isbn = models.CharField(max_length=13, unique=True)
     price = models.DecimalField(max_digits=5, decimal_places=2)
     cover_image = models.ImageField(upload_to='images/')
+    cover_renditions = models.JSONField(default=dict, blank=True, editable=False)
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['title', 'id'], name='book_title_id_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -22,6 +28,7 @@ class Order(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     order_date = models.DateTimeField(auto_now_add=True)
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
+    checkout_token = models.UUIDField(unique=True, null=True, blank=True, editable=False)
 
     def __str__(self):
         return f'Order {self.id} by {self.user.username}'
@@ -33,4 +40,20 @@ class OrderItem(models.Model):
     price = models.DecimalField(max_digits=5, decimal_places=2)
 
     def __str__(self):
-        return f'{self.quantity} of {self.book.title}'
\ No newline at end of file
+        return f'{self.quantity} of {self.book.title}'
+
+class DailySales(models.Model):
+    date = models.DateField()
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    order_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'daily sales'
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'category'], name='unique_daily_sales_per_category'),
+        ]
+
+    def __str__(self):
+        return f'{self.category} on {self.date}'
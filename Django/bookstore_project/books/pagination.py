@@ -0,0 +1,78 @@
+import base64
+import json
+
+from django.db.models import Q
+
+
+def encode_cursor(title, pk):
+    data = json.dumps([title, pk], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    # A tampered or stale cursor just sends the visitor back to the first page
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        title, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(title, str) or not isinstance(pk, int):
+        return None
+    return title, pk
+
+
+class KeysetPage:
+    def __init__(self, object_list, has_next, has_previous):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def next_cursor(self):
+        if self.has_next and self.object_list:
+            last = self.object_list[-1]
+            return encode_cursor(last.title, last.pk)
+
+    @property
+    def previous_cursor(self):
+        if self.has_previous and self.object_list:
+            first = self.object_list[0]
+            return encode_cursor(first.title, first.pk)
+
+
+class KeysetPaginator:
+    """Paginate a queryset on (title, pk) so every page is one indexed range scan."""
+
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset
+        self.per_page = per_page
+
+    def page(self, after=None, before=None):
+        after = decode_cursor(after) if after else None
+        before = decode_cursor(before) if before else None
+
+        if before:
+            title, pk = before
+            rows = list(
+                self.queryset
+                .filter(Q(title__lt=title) | Q(title=title, pk__lt=pk))
+                .order_by('-title', '-pk')[:self.per_page + 1]
+            )
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            rows.reverse()
+            return KeysetPage(rows, has_next=True, has_previous=has_previous)
+
+        queryset = self.queryset.order_by('title', 'pk')
+        if after:
+            title, pk = after
+            queryset = queryset.filter(Q(title__gt=title) | Q(title=title, pk__gt=pk))
+        rows = list(queryset[:self.per_page + 1])
+        has_next = len(rows) > self.per_page
+        return KeysetPage(rows[:self.per_page], has_next=has_next, has_previous=after is not None)
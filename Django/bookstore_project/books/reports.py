@@ -0,0 +1,72 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import connection
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailySales, OrderItem
+
+
+def record_order(order, lines):
+    """Add one order's lines to the daily rollup with a single upsert statement."""
+    day = timezone.localdate(order.order_date)
+    totals = defaultdict(lambda: [0, Decimal('0.00')])
+    for line in lines:
+        entry = totals[line.book.category_id]
+        entry[0] += line.quantity
+        entry[1] += line.total_price
+    if not totals:
+        return
+
+    table = DailySales._meta.db_table
+    values = ', '.join(['(%s, %s, %s, %s, 1)'] * len(totals))
+    params = []
+    for category_id, (units, revenue) in totals.items():
+        params += [day, category_id, units, revenue]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (date, category_id, units, revenue, order_count) VALUES {values} '
+            'ON CONFLICT (date, category_id) DO UPDATE SET '
+            f'units = {table}.units + excluded.units, '
+            f'revenue = {table}.revenue + excluded.revenue, '
+            f'order_count = {table}.order_count + excluded.order_count',
+            params,
+        )
+
+
+def rebuild_daily_sales(batch_size=1000):
+    """Recompute the whole rollup from OrderItem. Returns the number of rollup rows."""
+    line_total = ExpressionWrapper(F('quantity') * F('price'), output_field=DecimalField(max_digits=12, decimal_places=2))
+    rows = (
+        OrderItem.objects
+        .annotate(day=TruncDate('order__order_date'))
+        .values('day', 'book__category')
+        .annotate(units=Sum('quantity'), revenue=Sum(line_total), order_count=Count('order', distinct=True))
+        .order_by()
+    )
+    DailySales.objects.all().delete()
+    created = DailySales.objects.bulk_create(
+        (
+            DailySales(date=row['day'], category_id=row['book__category'], units=row['units'],
+                       revenue=row['revenue'], order_count=row['order_count'])
+            for row in rows.iterator()
+        ),
+        batch_size=batch_size,
+    )
+    return len(created)
+
+
+def sales_summary(start, end):
+    """Per-day and per-category totals for [start, end], read only from the rollup."""
+    rollup = DailySales.objects.filter(date__range=(start, end))
+    totals = {'units': Sum('units'), 'revenue': Sum('revenue')}
+    # An order spanning categories has a row in each, so order counts only add up per category
+    return {
+        'by_day': list(rollup.values('date').annotate(**totals).order_by('-date')),
+        'by_category': list(
+            rollup.values('category__name').annotate(orders=Sum('order_count'), **totals).order_by('-revenue')
+        ),
+        'total': rollup.aggregate(**totals),
+    }
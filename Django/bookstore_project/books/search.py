@@ -0,0 +1,196 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Book
+
+TERM_RE = re.compile(r'\w+')
+ISBN_HYPHEN_RE = re.compile(r'(?<=\d)-(?=\d)')
+
+
+def parse_terms(query):
+    # ISBNs are stored without hyphens, so "978-0-13" has to match "978013..."
+    return TERM_RE.findall(ISBN_HYPHEN_RE.sub('', query.lower()))
+
+
+class SQLiteSearchBackend:
+    """FTS5 virtual table whose rowid is the book id, ranked with bm25."""
+
+    table = 'books_book_fts'
+    # bm25 column weights: title, author, isbn, category
+    weights = (10.0, 5.0, 8.0, 2.0)
+
+    def _reindex(self, where, params):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {self.table} WHERE rowid IN '
+                f'(SELECT b.id FROM books_book b {where})',
+                params,
+            )
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, title, author, isbn, category) '
+                'SELECT b.id, b.title, b.author, b.isbn, c.name FROM books_book b '
+                f'JOIN books_category c ON c.id = b.category_id {where}',
+                params,
+            )
+
+    def index_books(self, pks):
+        pks = list(pks)
+        if pks:
+            self._reindex(f"WHERE b.id IN ({', '.join(['%s'] * len(pks))})", pks)
+
+    def index_category(self, category_id):
+        self._reindex('WHERE b.category_id = %s', [category_id])
+
+    def remove_books(self, pks):
+        pks = list(pks)
+        if not pks:
+            return
+        placeholders = ', '.join(['%s'] * len(pks))
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid IN ({placeholders})', pks)
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+        self._reindex('', [])
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {self.table} ({self.table}) VALUES ('optimize')")
+
+    def search(self, terms, offset, limit):
+        match = ' '.join(f'"{term}"*' for term in terms)
+        weights = ', '.join(str(w) for w in self.weights)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s '
+                f'ORDER BY bm25({self.table}, {weights}), rowid LIMIT %s OFFSET %s',
+                [match, limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class PostgresSearchBackend:
+    """Weighted tsvector per book in a side table with a GIN index."""
+
+    table = 'books_book_search'
+    document_sql = (
+        "setweight(to_tsvector('simple', b.title), 'A') || "
+        "setweight(to_tsvector('simple', b.isbn), 'A') || "
+        "setweight(to_tsvector('simple', b.author), 'B') || "
+        "setweight(to_tsvector('simple', c.name), 'C')"
+    )
+
+    def _upsert(self, where, params):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {self.table} (book_id, document) '
+                f'SELECT b.id, {self.document_sql} FROM books_book b '
+                f'JOIN books_category c ON c.id = b.category_id {where} '
+                'ON CONFLICT (book_id) DO UPDATE SET document = EXCLUDED.document',
+                params,
+            )
+
+    def index_books(self, pks):
+        pks = list(pks)
+        if pks:
+            self._upsert('WHERE b.id = ANY(%s)', [pks])
+
+    def index_category(self, category_id):
+        self._upsert('WHERE b.category_id = %s', [category_id])
+
+    def remove_books(self, pks):
+        pks = list(pks)
+        if not pks:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE book_id = ANY(%s)', [pks])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'TRUNCATE {self.table}')
+        self._upsert('', [])
+
+    def search(self, terms, offset, limit):
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT book_id FROM {self.table}, to_tsquery('simple', %s) query "
+                'WHERE document @@ query '
+                'ORDER BY ts_rank(document, query) DESC, book_id LIMIT %s OFFSET %s',
+                [tsquery, limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class FallbackSearchBackend:
+    """Unindexed ORM search for databases without a full-text backend."""
+
+    def index_books(self, pks):
+        pass
+
+    def index_category(self, category_id):
+        pass
+
+    def remove_books(self, pks):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def search(self, terms, offset, limit):
+        condition = Q()
+        for term in terms:
+            condition &= (
+                Q(title__icontains=term) | Q(author__icontains=term)
+                | Q(isbn__icontains=term) | Q(category__name__icontains=term)
+            )
+        return list(
+            Book.objects.filter(condition).order_by('title', 'pk')
+            .values_list('pk', flat=True)[offset:offset + limit]
+        )
+
+
+def get_backend():
+    if connection.vendor == 'sqlite':
+        return SQLiteSearchBackend()
+    if connection.vendor == 'postgresql':
+        return PostgresSearchBackend()
+    return FallbackSearchBackend()
+
+
+class SearchResults:
+    def __init__(self, object_list, number, has_next):
+        self.object_list = object_list
+        self.number = number
+        self.has_next = has_next
+        self.has_previous = number > 1
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return self.number - 1
+
+
+def search_books(query, page=1, per_page=25):
+    terms = parse_terms(query)
+    if not terms:
+        return SearchResults([], page, False)
+    offset = (page - 1) * per_page
+    pks = get_backend().search(terms, offset, per_page + 1)
+    has_next = len(pks) > per_page
+    pks = pks[:per_page]
+    books = (
+        Book.objects.select_related('category')
+        .only('title', 'author', 'category__name')
+        .in_bulk(pks)
+    )
+    # in_bulk loses the relevance order, and a row deleted mid-request is simply skipped
+    return SearchResults([books[pk] for pk in pks if pk in books], page, has_next)
@@ -0,0 +1,50 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import catalog
+from .covers import needs_renditions, schedule_renditions
+from .models import Book, Category
+from .search import get_backend
+
+
+@receiver(post_save, sender=Book)
+def index_book(sender, instance, raw=False, **kwargs):
+    if not raw:
+        get_backend().index_books([instance.pk])
+
+
+@receiver(post_save, sender=Book)
+def render_cover(sender, instance, raw=False, **kwargs):
+    if not raw and needs_renditions(instance):
+        schedule_renditions(instance)
+
+
+@receiver(post_delete, sender=Book)
+def unindex_book(sender, instance, **kwargs):
+    get_backend().remove_books([instance.pk])
+
+
+@receiver(post_save, sender=Category)
+def reindex_category(sender, instance, created=False, raw=False, **kwargs):
+    # A new category has no books yet; a rename changes every book it holds
+    if not raw and not created:
+        get_backend().index_category(instance.pk)
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def invalidate_book(sender, instance, raw=False, **kwargs):
+    # After commit, so a reader can't re-cache the old row under the new version
+    def invalidate():
+        catalog.forget_book(instance.pk)
+        catalog.bump_category(instance.category_id)
+    if not raw:
+        transaction.on_commit(invalidate)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category(sender, instance, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(lambda: catalog.bump_category(instance.pk))
@@ -0,0 +1,67 @@
+// Batches "Add to Cart" clicks into one JSON request instead of a form post
+// and full page render per click. Forms without JavaScript still post normally.
+(function () {
+    var endpoint = document.body.dataset.cartApi;
+    if (!endpoint || !window.fetch) {
+        return;
+    }
+    var pending = {};
+    var timer = null;
+
+    function csrfToken() {
+        var input = document.querySelector('[name=csrfmiddlewaretoken]');
+        return input ? input.value : '';
+    }
+
+    function render(summary) {
+        document.querySelectorAll('[data-cart-count]').forEach(function (el) {
+            el.textContent = summary.item_count;
+        });
+        document.querySelectorAll('[data-cart-status]').forEach(function (el) {
+            el.textContent = 'Cart: ' + summary.item_count + ' item(s), $' + summary.total;
+        });
+    }
+
+    function flush() {
+        var items = pending;
+        pending = {};
+        timer = null;
+        fetch(endpoint, {
+            method: 'POST',
+            credentials: 'same-origin',
+            keepalive: true,
+            headers: {'Content-Type': 'application/json', 'X-CSRFToken': csrfToken()},
+            body: JSON.stringify({items: items})
+        }).then(function (response) {
+            return response.json();
+        }).then(function (summary) {
+            if (summary.error) {
+                throw new Error(summary.error);
+            }
+            render(summary);
+        }).catch(function (error) {
+            document.querySelectorAll('[data-cart-status]').forEach(function (el) {
+                el.textContent = 'Could not update cart: ' + error.message;
+            });
+        });
+    }
+
+    document.addEventListener('submit', function (event) {
+        var form = event.target.closest('form[data-cart-add]');
+        if (!form) {
+            return;
+        }
+        event.preventDefault();
+        var pk = form.dataset.cartAdd;
+        pending[pk] = (pending[pk] || 0) + 1;
+        clearTimeout(timer);
+        timer = setTimeout(flush, 300);
+    });
+
+    window.addEventListener('pagehide', function () {
+        if (timer) {
+            clearTimeout(timer);
+            flush();
+        }
+    });
+})();
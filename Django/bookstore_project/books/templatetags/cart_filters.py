@@ -1,10 +1,12 @@
+from decimal import Decimal
+
 from django import template
 
 register = template.Library()
 
 @register.filter
-def calculate_cart_total(cart_items):
-    total = 0
-    for item in cart_items:
-        total += item['total_price']
-    return total
+def calculate_cart_total(cart):
+    # Accepts a resolved Cart or any iterable of its lines
+    if hasattr(cart, 'total'):
+        return cart.total
+    return sum((item.total_price for item in cart), Decimal('0.00'))
@@ -0,0 +1,34 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html
+
+from ..covers import RENDITIONS
+
+register = template.Library()
+
+def _srcset(renditions, fmt):
+    return ', '.join(
+        f"{default_storage.url(renditions[name][fmt])} {renditions[name]['width']}w"
+        for name in RENDITIONS if name in renditions
+    )
+
+@register.simple_tag
+def cover_picture(book, rendition='detail'):
+    """Render a responsive <picture> for the cover, or the original upload until renditions exist."""
+    renditions = book.cover_renditions
+    alt = f'{book.title} Cover'
+    if renditions.get('source') != book.cover_image.name or rendition not in renditions:
+        if not book.cover_image:
+            return ''
+        return format_html('<img src="{}" alt="{}" width="{}">', book.cover_image.url, alt, RENDITIONS[rendition])
+    chosen = renditions[rendition]
+    sizes = f"(max-width: {chosen['width']}px) 100vw, {chosen['width']}px"
+    return format_html(
+        '<picture>'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}" loading="lazy">'
+        '</picture>',
+        _srcset(renditions, 'webp'), sizes,
+        default_storage.url(chosen['jpeg']), _srcset(renditions, 'jpeg'), sizes,
+        chosen['width'], chosen['height'], alt,
+    )
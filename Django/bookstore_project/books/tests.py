@@ -1,3 +1,553 @@
-from django.test import TestCase
+from django.test import TestCase, Client
+from django.urls import reverse
+from django.db import connection
+from django.contrib.auth.models import User
+from django.test.utils import CaptureQueriesContext
+from django.core.management import call_command
+from django.core.cache import cache
+from io import BytesIO, StringIO
+from decimal import Decimal
+import itertools
+import json
+import shutil
+import tempfile
+import os
+from PIL import Image
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.storage import default_storage
+from django.test import override_settings
+from .models import Book, Category, DailySales, Order, OrderItem
+from .views import BookListView
+from . import catalog, loadtest
 
-# Create your tests here.
+@override_settings(COVER_RENDITIONS_ASYNC=False)
+class BookstoreTestCase(TestCase):
+    def setUp(self):
+        # The catalog cache is process-wide and would leak pages between tests
+        cache.clear()
+
+isbns = itertools.count(1)
+
+def make_books(category, count, prefix='Book'):
+    return Book.objects.bulk_create([
+        Book(title=f'{prefix} {i:04d}', author='Author', isbn=f'{next(isbns):013d}', price='9.99',
+             cover_image='images/cover.jpg', category=category)
+        for i in range(count)
+    ])
+
+class BookListViewTest(BookstoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        self.category = Category.objects.create(name='Fiction')
+
+    def test_pages_follow_title_order(self):
+        make_books(self.category, BookListView.page_size + 5)
+        response = self.client.get(reverse('book_list'))
+        page = response.context['page']
+        self.assertEqual(len(page), BookListView.page_size)
+        self.assertTrue(page.has_next)
+        self.assertFalse(page.has_previous)
+
+        response = self.client.get(reverse('book_list'), {'after': page.next_cursor})
+        second = response.context['page']
+        self.assertEqual(len(second), 5)
+        self.assertFalse(second.has_next)
+        self.assertTrue(second.has_previous)
+        self.assertEqual(second.object_list[0].title, f'Book {BookListView.page_size:04d}')
+
+        response = self.client.get(reverse('book_list'), {'before': second.previous_cursor})
+        self.assertEqual([b.pk for b in response.context['page']], [b.pk for b in page])
+
+    def test_duplicate_titles_are_not_skipped(self):
+        Book.objects.bulk_create([
+            Book(title='Same', author='Author', isbn=str(i), price='1.00',
+                 cover_image='images/cover.jpg', category=self.category)
+            for i in range(BookListView.page_size + 1)
+        ])
+        first = self.client.get(reverse('book_list')).context['page']
+        second = self.client.get(reverse('book_list'), {'after': first.next_cursor}).context['page']
+        seen = {b.pk for b in first} | {b.pk for b in second}
+        self.assertEqual(len(seen), BookListView.page_size + 1)
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        make_books(self.category, 3)
+        response = self.client.get(reverse('book_list'), {'after': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['page']), 3)
+
+    def test_query_count_is_constant(self):
+        make_books(self.category, 10)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(reverse('book_list'))
+        make_books(self.category, 200, prefix='More')
+        cache.clear()
+        with CaptureQueriesContext(connection) as large:
+            self.client.get(reverse('book_list'))
+        self.assertEqual(len(small), len(large))
+
+class BookSearchTest(BookstoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        self.fiction = Category.objects.create(name='Fiction')
+        self.history = Category.objects.create(name='History')
+        self.dune = Book.objects.create(title='Dune', author='Frank Herbert', isbn='9780441013593',
+                                        price='9.99', cover_image='images/dune.jpg', category=self.fiction)
+        self.rome = Book.objects.create(title='SPQR', author='Mary Beard', isbn='9781631492228',
+                                        price='19.99', cover_image='images/spqr.jpg', category=self.history)
+
+    def search(self, q, **params):
+        return self.client.get(reverse('book_search'), {'q': q, **params})
+
+    def test_matches_title_author_isbn_and_category(self):
+        for q in ['dune', 'herb', '978-0-441-01359-3', 'fiction']:
+            books = list(self.search(q).context['books'])
+            self.assertEqual(books, [self.dune], q)
+
+    def test_title_match_ranks_above_category_match(self):
+        history_book = Book.objects.create(title='A History of Fiction', author='Someone', isbn='1',
+                                           price='5.00', cover_image='images/x.jpg', category=self.history)
+        books = list(self.search('history').context['books'])
+        self.assertEqual(books[0], history_book)
+        self.assertIn(self.rome, books)
+
+    def test_missing_query_redirects_to_list(self):
+        response = self.client.get(reverse('book_search'))
+        self.assertRedirects(response, reverse('book_list'))
+
+    def test_index_follows_edits_and_deletes(self):
+        self.dune.title = 'Children of Dune'
+        self.dune.save()
+        self.assertEqual(list(self.search('children').context['books']), [self.dune])
+        self.fiction.name = 'Science Fiction'
+        self.fiction.save()
+        self.assertEqual(list(self.search('science').context['books']), [self.dune])
+        self.dune.delete()
+        self.assertEqual(list(self.search('dune').context['books']), [])
+
+    def test_results_are_paginated(self):
+        make_books(self.fiction, BookListView.page_size + 2, prefix='Saga')
+        call_command('rebuild_search_index', stdout=StringIO())
+        first = self.search('saga').context['search_page']
+        self.assertEqual(len(first), BookListView.page_size)
+        self.assertTrue(first.has_next)
+        second = self.search('saga', page=2).context['search_page']
+        self.assertEqual(len(second), 2)
+        self.assertFalse(second.has_next)
+
+class CartDetailTest(BookstoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        self.category = Category.objects.create(name='Fiction')
+        self.books = make_books(self.category, 40)
+
+    def set_cart(self, cart):
+        session = self.client.session
+        session['cart'] = cart
+        session.save()
+
+    def test_cart_resolves_in_one_query(self):
+        self.set_cart({str(b.pk): 2 for b in self.books})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('cart_detail'))
+        book_queries = [q for q in queries if 'books_book' in q['sql']]
+        self.assertEqual(len(book_queries), 1)
+        cart = response.context['cart']
+        self.assertEqual(len(cart), 40)
+        self.assertEqual(cart.total, Decimal('9.99') * 80)
+
+    def test_add_to_cart_stores_only_quantities(self):
+        book = self.books[0]
+        self.client.post(reverse('add_to_cart', args=[book.pk]))
+        self.client.post(reverse('add_to_cart', args=[book.pk]))
+        self.assertEqual(self.client.session['cart'], {str(book.pk): 2})
+
+    def test_legacy_session_cart_is_priced_from_database(self):
+        book = self.books[0]
+        self.set_cart({str(book.pk): {'quantity': 3, 'price': '0.01', 'title': 'stale'}})
+        cart = self.client.get(reverse('cart_detail')).context['cart']
+        self.assertEqual(cart.total, Decimal('29.97'))
+        self.client.post(reverse('add_to_cart', args=[book.pk]))
+        self.assertEqual(self.client.session['cart'], {str(book.pk): 4})
+
+    def test_stale_book_is_dropped_instead_of_404(self):
+        self.set_cart({str(self.books[0].pk): 1, '999999': 1})
+        response = self.client.get(reverse('cart_detail'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['cart']), 1)
+        self.assertNotIn('999999', self.client.session['cart'])
+        self.assertContains(response, 'no longer available')
+
+class CheckoutTest(BookstoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        self.user = User.objects.create_user(username='reader', password='testpassword')
+        self.client.login(username='reader', password='testpassword')
+        self.category = Category.objects.create(name='Fiction')
+
+    def fill_cart(self, books, quantity=1):
+        session = self.client.session
+        session['cart'] = {str(b.pk): quantity for b in books}
+        session.save()
+        return self.client.get(reverse('cart_detail')).context['checkout_token']
+
+    def checkout(self, token):
+        return self.client.post(reverse('checkout'), {'checkout_token': token})
+
+    def test_order_is_priced_from_database(self):
+        books = make_books(self.category, 3)
+        token = self.fill_cart(books, quantity=2)
+        response = self.checkout(token)
+        self.assertRedirects(response, reverse('book_list'))
+        order = Order.objects.get(user=self.user)
+        self.assertEqual(order.total_price, Decimal('59.94'))
+        self.assertEqual(order.orderitem_set.count(), 3)
+        self.assertEqual(self.client.session['cart'], {})
+
+    def test_resubmitted_checkout_creates_one_order(self):
+        books = make_books(self.category, 2)
+        token = self.fill_cart(books)
+        self.checkout(token)
+        # A retried POST with the same token and a still-populated cart
+        self.fill_cart(books)
+        self.checkout(token)
+        self.assertEqual(Order.objects.filter(user=self.user).count(), 1)
+
+    def test_replayed_token_keeps_the_refilled_cart(self):
+        books = make_books(self.category, 2)
+        first = self.fill_cart(books[:1])
+        self.checkout(first)
+        second = self.fill_cart(books[1:], quantity=3)
+        self.checkout(first)
+        self.assertEqual(self.client.session['cart'], {str(books[1].pk): 3})
+        self.assertEqual(Order.objects.filter(user=self.user).count(), 1)
+        self.checkout(second)
+        self.assertEqual(Order.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(self.client.session['cart'], {})
+
+    def test_get_is_not_allowed(self):
+        self.assertEqual(self.client.get(reverse('checkout')).status_code, 405)
+
+    def test_query_count_is_flat_from_1_to_500_lines(self):
+        books = make_books(self.category, 500)
+        batch_size = connection.ops.bulk_batch_size(['order', 'book', 'quantity', 'price'], [])
+        counts = {}
+        for size in (1, 10, 100, 500):
+            token = self.fill_cart(books[:size])
+            with CaptureQueriesContext(connection) as queries:
+                self.checkout(token)
+            # SQLite caps parameters per statement, so one bulk_create may be split into batches
+            inserts = [q for q in queries if q['sql'].startswith('INSERT INTO "books_orderitem"')]
+            self.assertEqual(len(inserts), -(-size // batch_size))
+            counts[size] = len(queries) - len(inserts)
+        self.assertEqual(len(set(counts.values())), 1, counts)
+
+class OrderHistoryTest(BookstoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        self.user = User.objects.create_user(username='reader', password='testpassword')
+        self.client.login(username='reader', password='testpassword')
+        self.books = make_books(Category.objects.create(name='Fiction'), 5)
+
+    def place_orders(self, count):
+        orders = Order.objects.bulk_create([Order(user=self.user, total_price='9.99') for _ in range(count)])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, book=book, quantity=1, price='9.99')
+            for order in orders for book in self.books
+        ])
+
+    def test_query_count_does_not_depend_on_history_size(self):
+        self.place_orders(1)
+        with self.assertNumQueries(4):
+            self.client.get(reverse('order_history'))
+        self.place_orders(30)
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('order_history'))
+        page = response.context['page_obj']
+        self.assertEqual(len(page), 10)
+        self.assertEqual(page.paginator.count, 31)
+        self.assertContains(response, self.books[0].title)
+
+def make_cover(width=900, height=1200):
+    buffer = BytesIO()
+    Image.new('RGB', (width, height), 'navy').save(buffer, 'JPEG')
+    return SimpleUploadedFile('cover.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+class CoverRenditionTest(BookstoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.category = Category.objects.create(name='Fiction')
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def test_upload_generates_hashed_renditions(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            book = Book.objects.create(title='Dune', author='Frank Herbert', isbn='1', price='9.99',
+                                       cover_image=make_cover(), category=self.category)
+        book.refresh_from_db()
+        renditions = book.cover_renditions
+        self.assertEqual(renditions['source'], book.cover_image.name)
+        self.assertEqual(renditions['detail']['width'], 480)
+        self.assertEqual(renditions['thumbnail']['height'], 160)
+        self.assertRegex(renditions['list']['webp'], r'^covers/[0-9a-f]{24}\.webp$')
+
+        response = self.client.get(reverse('book_detail', args=[book.pk]))
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, '480w')
+
+    def test_detail_falls_back_to_original_before_rendering(self):
+        book = Book.objects.create(title='Dune', author='Frank Herbert', isbn='1', price='9.99',
+                                   cover_image='images/dune.jpg', category=self.category)
+        response = self.client.get(reverse('book_detail', args=[book.pk]))
+        self.assertContains(response, 'src="/media/images/dune.jpg"')
+
+    def test_backfill_command(self):
+        name = default_storage.save('images/cover.jpg', make_cover())
+        Book.objects.bulk_create([
+            Book(title=f'Book {i}', author='Author', isbn=str(i), price='9.99',
+                 cover_image=name, category=self.category)
+            for i in range(2)
+        ])
+        call_command('backfill_covers', workers=1, stdout=StringIO())
+        for book in Book.objects.all():
+            self.assertEqual(book.cover_renditions['source'], name)
+
+class CatalogCacheTest(BookstoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        self.category = Category.objects.create(name='Fiction')
+        self.book = Book.objects.create(title='Dune', author='Frank Herbert', isbn='1', price='9.99',
+                                        cover_image='images/dune.jpg', category=self.category,
+                                        cover_renditions={'source': 'images/dune.jpg'})
+
+    def test_repeated_reads_skip_the_database(self):
+        for url in [reverse('book_list'), reverse('book_detail', args=[self.book.pk]),
+                    reverse('book_search') + '?q=dune']:
+            self.client.get(url)
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(url)
+            self.assertFalse([q for q in queries if 'books_book' in q['sql']], url)
+        self.assertEqual(catalog.stats()['hits'], 3)
+        self.assertEqual(catalog.stats()['misses'], 3)
+
+    def test_book_edit_invalidates_list_and_detail(self):
+        self.client.get(reverse('book_list'))
+        self.client.get(reverse('book_detail', args=[self.book.pk]))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.title = 'Dune Messiah'
+            self.book.save()
+        self.assertContains(self.client.get(reverse('book_list')), 'Dune Messiah')
+        self.assertContains(self.client.get(reverse('book_detail', args=[self.book.pk])), 'Dune Messiah')
+
+    def test_category_rename_invalidates_its_books(self):
+        self.client.get(reverse('book_detail', args=[self.book.pk]))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = 'Science Fiction'
+            self.category.save()
+        self.assertContains(self.client.get(reverse('book_detail', args=[self.book.pk])), 'Science Fiction')
+
+    def test_rename_during_a_miss_is_not_cached_under_the_new_version(self):
+        def rename_then_read():
+            book = Book.objects.select_related('category').get(pk=self.book.pk)
+            # The rename commits after the row was read
+            with self.captureOnCommitCallbacks(execute=True):
+                self.category.name = 'Science Fiction'
+                self.category.save()
+            return book
+
+        catalog.cached_book(self.book.pk, rename_then_read, lambda: self.category.pk)
+        self.assertContains(self.client.get(reverse('book_detail', args=[self.book.pk])), 'Science Fiction')
+
+    def test_delete_through_delete_view(self):
+        User.objects.create_user(username='editor', password='testpassword')
+        self.client.login(username='editor', password='testpassword')
+        self.client.get(reverse('book_list'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('book_delete', args=[self.book.pk]))
+        self.assertNotContains(self.client.get(reverse('book_list')), 'Dune')
+
+    def test_stats_are_staff_only(self):
+        self.assertEqual(self.client.get(reverse('catalog_cache_stats')).status_code, 302)
+        User.objects.create_user(username='admin', password='testpassword', is_staff=True)
+        self.client.login(username='admin', password='testpassword')
+        self.assertEqual(set(self.client.get(reverse('catalog_cache_stats')).json()), {'hits', 'misses', 'hit_ratio'})
+
+class ImportBooksTest(BookstoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.feed_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.feed_dir, ignore_errors=True)
+
+    def write_feed(self, name, content):
+        path = os.path.join(self.feed_dir, name)
+        with open(path, 'w', encoding='utf-8') as feed:
+            feed.write(content)
+        return path
+
+    def test_csv_import_creates_categories_and_books(self):
+        path = self.write_feed('feed.csv', (
+            'title,author,isbn,price,category\n'
+            'Dune,Frank Herbert,978-0441013593,9.99,Science Fiction\n'
+            'SPQR,Mary Beard,9781631492228,19.50,History\n'
+            'Broken,Nobody,,1.00,History\n'
+        ))
+        out = StringIO()
+        call_command('import_books', path, batch_size=1, stdout=out)
+        self.assertEqual(Category.objects.count(), 2)
+        dune = Book.objects.get(isbn='9780441013593')
+        self.assertEqual(dune.category.name, 'Science Fiction')
+        self.assertIn('2 books upserted, 1 rows skipped', out.getvalue())
+        self.assertIn('rows/s', out.getvalue())
+
+    def test_jsonl_import_updates_existing_isbn(self):
+        category = Category.objects.create(name='History')
+        book = Book.objects.create(title='Old title', author='Mary Beard', isbn='9781631492228',
+                                   price='5.00', cover_image='images/spqr.jpg', category=category)
+        path = self.write_feed('feed.jsonl', (
+            '{"title": "SPQR", "author": "Mary Beard", "isbn": "9781631492228", "price": "19.50", "category": "History"}\n'
+        ))
+        call_command('import_books', path, stdout=StringIO())
+        book.refresh_from_db()
+        self.assertEqual(book.title, 'SPQR')
+        self.assertEqual(book.price, Decimal('19.50'))
+        self.assertEqual(book.cover_image.name, 'images/spqr.jpg')
+        self.assertEqual(Book.objects.count(), 1)
+        self.assertEqual(list(self.client.get(reverse('book_search'), {'q': 'spqr'}).context['books']), [book])
+
+    def test_malformed_jsonl_rows_are_skipped(self):
+        path = self.write_feed('feed.jsonl', (
+            '{"title": "Dune", "author": "Frank Herbert", "isbn": "9780441013593", "price": "NaN", "category": "SF"}\n'
+            '{"title": "Dune", "author": "Frank Herbert", "isbn": "9780441013593", "price": "Infinity", "category": "SF"}\n'
+            '{"title": "SPQR", "author": "Mary Beard"\n'
+            '["SPQR", "Mary Beard"]\n'
+            '42\n'
+            '{"title": "SPQR", "author": "Mary Beard", "isbn": "9781631492228", "price": "19.50", "category": "History"}\n'
+        ))
+        out = StringIO()
+        call_command('import_books', path, stdout=out)
+        self.assertIn('1 books upserted, 5 rows skipped', out.getvalue())
+        self.assertEqual(list(Book.objects.values_list('title', flat=True)), ['SPQR'])
+
+class SalesRollupTest(BookstoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        self.user = User.objects.create_user(username='reader', password='testpassword')
+        self.client.login(username='reader', password='testpassword')
+        self.fiction = Category.objects.create(name='Fiction')
+        self.history = Category.objects.create(name='History')
+        self.books = make_books(self.fiction, 2) + make_books(self.history, 1, prefix='Past')
+
+    def buy(self, books, quantity=1):
+        session = self.client.session
+        session['cart'] = {str(b.pk): quantity for b in books}
+        session.save()
+        token = self.client.get(reverse('cart_detail')).context['checkout_token']
+        self.client.post(reverse('checkout'), {'checkout_token': token})
+
+    def rollup(self):
+        return {
+            row.category_id: (row.units, row.revenue, row.order_count)
+            for row in DailySales.objects.all()
+        }
+
+    def test_checkout_updates_rollup_incrementally(self):
+        self.buy(self.books, quantity=2)
+        self.buy(self.books[:1])
+        self.assertEqual(self.rollup(), {
+            self.fiction.pk: (5, Decimal('49.95'), 2),
+            self.history.pk: (2, Decimal('19.98'), 1),
+        })
+
+    def test_rebuild_matches_incremental_rollup(self):
+        self.buy(self.books, quantity=2)
+        self.buy(self.books[1:])
+        incremental = self.rollup()
+        DailySales.objects.all().delete()
+        call_command('rebuild_sales_rollup', stdout=StringIO())
+        self.assertEqual(self.rollup(), incremental)
+
+    def test_report_reads_only_the_rollup(self):
+        self.buy(self.books)
+        self.assertEqual(self.client.get(reverse('sales_report')).status_code, 302)
+        User.objects.create_user(username='admin', password='testpassword', is_staff=True)
+        self.client.login(username='admin', password='testpassword')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('sales_report'))
+        self.assertFalse([q for q in queries if 'books_order' in q['sql']])
+        self.assertEqual(response.context['total']['units'], 3)
+        self.assertContains(response, 'History')
+
+class CartApiTest(BookstoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        self.books = make_books(Category.objects.create(name='Fiction'), 5)
+
+    def post(self, items):
+        return self.client.post(reverse('cart_api'), json.dumps({'items': items}), content_type='application/json')
+
+    def test_batch_update_returns_summary_without_redirect(self):
+        items = {str(book.pk): 2 for book in self.books}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post(items)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len([q for q in queries if 'books_book' in q['sql']]), 1)
+        summary = response.json()
+        self.assertEqual(summary['item_count'], 10)
+        self.assertEqual(summary['total'], '99.90')
+        self.assertEqual(self.client.session['cart'], items)
+
+    def test_negative_changes_remove_lines(self):
+        self.post({str(self.books[0].pk): 1, str(self.books[1].pk): 1})
+        summary = self.post({str(self.books[0].pk): -1}).json()
+        self.assertEqual([item['pk'] for item in summary['items']], [self.books[1].pk])
+
+    def test_unknown_book_rejects_whole_batch(self):
+        response = self.post({str(self.books[0].pk): 1, '999999': 1})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['unknown'], [999999])
+        self.assertNotIn('cart', self.client.session)
+
+    def test_malformed_payload(self):
+        response = self.client.post(reverse('cart_api'), 'nope', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.post({str(self.books[0].pk): 1000}).status_code, 400)
+
+    def test_get_returns_current_cart(self):
+        self.post({str(self.books[0].pk): 3})
+        self.assertEqual(self.client.get(reverse('cart_api')).json()['item_count'], 3)
+
+class LoadTestHarnessTest(BookstoreTestCase):
+    def test_seed_builds_a_consistent_dataset(self):
+        loadtest.seed(books=50, categories=3, users=4, orders=10, batch_size=7, log=lambda message: None)
+        self.assertEqual(Book.objects.count(), 50)
+        self.assertEqual(Order.objects.count(), 10)
+        order = Order.objects.first()
+        lines = order.orderitem_set.all()
+        self.assertEqual(order.total_price, sum(item.price * item.quantity for item in lines))
+        self.assertTrue(DailySales.objects.exists())
+        book = Book.objects.first()
+        results = self.client.get(reverse('book_search'), {'q': book.title}).context['books']
+        self.assertIn(book, list(results))
+
+    def test_summary_reports_percentiles_and_queries(self):
+        recorder = loadtest.Recorder()
+        for ms in range(1, 101):
+            recorder.record('list', ms / 1000, 2, ok=ms != 100)
+        summary = loadtest.summarize(recorder, wall=2.0, failures=[])
+        row = summary['scenarios']['list']
+        self.assertEqual((row['p50_ms'], row['p99_ms']), (50.5, 99.01))
+        self.assertEqual(row['errors'], 1)
+        self.assertEqual(row['queries_per_request'], 2)
+        self.assertEqual(summary['throughput_rps'], 50.0)
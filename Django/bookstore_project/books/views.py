@@ -1,53 +1,105 @@
+import json
+from datetime import date, timedelta
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from django.shortcuts import get_object_or_404, redirect, render
 from django.contrib import messages
-from django.db.models import Q
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.decorators import login_required
+from django.views.decorators.http import require_POST, require_http_methods
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
 from django.urls import reverse_lazy
-from django.db import transaction
+from django.utils import timezone
+from django.core.paginator import Paginator
+from django.db.models import Prefetch
 from .models import Book, Category, Order, OrderItem
 from .forms import BookForm
+from .cart import add_to_session, apply_changes, get_cart
+from .catalog import cached_book, cached_catalog_read, stats as catalog_cache_stats
+from .checkout import CHECKOUT_TOKEN_SESSION_KEY, get_checkout_token, parse_checkout_token, place_order
+from .pagination import KeysetPaginator
+from .reports import sales_summary
+from .search import search_books
+
+MAX_QUANTITY_CHANGE = 99
 
 class BookListView(ListView):
     model = Book
     template_name = 'books/book_list.html'
     context_object_name = 'books'
+    page_size = 25
+
+    def get_queryset(self):
+        return Book.objects.select_related('category').only('title', 'author', 'category__name')
+
+    def get_context_data(self, **kwargs):
+        after, before = self.request.GET.get('after'), self.request.GET.get('before')
+        page = cached_catalog_read(
+            'list', (after, before),
+            lambda: KeysetPaginator(self.object_list, self.page_size).page(after=after, before=before),
+        )
+        kwargs['page'] = page
+        return super().get_context_data(object_list=page.object_list, **kwargs)
 
 class BookDetailView(DetailView):
     model = Book
     template_name = 'books/book_detail.html'
     context_object_name = 'book'
 
+    def get_object(self, queryset=None):
+        pk = self.kwargs['pk']
+        return cached_book(
+            pk,
+            lambda: get_object_or_404(Book.objects.select_related('category'), pk=pk),
+            lambda: Book.objects.filter(pk=pk).values_list('category_id', flat=True).first(),
+        )
+
 def add_to_cart(request, pk):
-    book = get_object_or_404(Book, pk=pk)
-    cart = request.session.get('cart', {})
-    cart_item = cart.get(str(pk), {'quantity': 0, 'price': str(book.price), 'title': book.title})
-    cart_item['quantity'] += 1
-    cart[str(pk)] = cart_item
-    request.session['cart'] = cart
+    book = get_object_or_404(Book.objects.only('title'), pk=pk)
+    add_to_session(request.session, book.pk)
     messages.success(request, f'{book.title} added to cart.')
     return redirect('book_list')
 
+@require_http_methods(['GET', 'POST'])
+def cart_api(request):
+    if request.method == 'GET':
+        return JsonResponse(get_cart(request).as_dict())
+    try:
+        items = json.loads(request.body)['items']
+        changes = {int(pk): int(quantity) for pk, quantity in items.items()}
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return JsonResponse({'error': 'Expected {"items": {"<book id>": <quantity change>}}.'}, status=400)
+    if any(abs(quantity) > MAX_QUANTITY_CHANGE for quantity in changes.values()):
+        return JsonResponse({'error': f'Quantity changes are limited to {MAX_QUANTITY_CHANGE}.'}, status=400)
+    cart, unknown = apply_changes(request.session, changes)
+    if unknown:
+        return JsonResponse({'error': 'Unknown books.', 'unknown': unknown}, status=400)
+    return JsonResponse(cart.as_dict())
+
 def cart_detail(request):
-    cart = request.session.get('cart', {})
-    cart_items = []
-    for pk, item in cart.items():
-        book = get_object_or_404(Book, pk=pk)
-        cart_items.append({
-            'book': book,
-            'quantity': item['quantity'],
-            'price': float(item['price']),
-            'total_price': float(item['price']) * item['quantity']
-        })
-    return render(request, 'books/cart_detail.html', {'cart_items': cart_items})
+    cart = get_cart(request)
+    if cart.missing:
+        cart.prune_missing(request.session)
+        messages.warning(request, 'Some books in your cart are no longer available and were removed.')
+    return render(request, 'books/cart_detail.html', {
+        'cart': cart,
+        'cart_items': cart.lines,
+        'checkout_token': get_checkout_token(request.session),
+    })
 
 def book_search(request):
-    query = request.GET.get('q')
-    books = Book.objects.filter(
-        Q(title__icontains=query) | Q(author__icontains=query) | Q(category__name__icontains=query)
-    ).distinct()
-    return render(request, 'books/book_list.html', {'books': books, 'query': query})
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return redirect('book_list')
+    try:
+        page_number = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page_number = 1
+    results = cached_catalog_read(
+        'search', (query.lower(), page_number),
+        lambda: search_books(query, page_number, per_page=BookListView.page_size),
+    )
+    return render(request, 'books/book_list.html', {'books': results, 'query': query, 'search_page': results})
 
 class BookCreateView(LoginRequiredMixin, CreateView):
     model = Book
@@ -67,28 +119,55 @@ class BookDeleteView(LoginRequiredMixin, DeleteView):
     success_url = reverse_lazy('book_list')
 
 @login_required
+@require_POST
 def checkout(request):
-    cart = request.session.get('cart', {})
+    token = parse_checkout_token(request.POST.get('checkout_token'))
+    if token is None:
+        messages.warning(request, "Please review your cart before checking out.")
+        return redirect('cart_detail')
+
+    cart = get_cart(request)
     if not cart:
         messages.warning(request, "Your cart is empty.")
         return redirect('cart_detail')
 
-    with transaction.atomic():
-        total_price = sum(float(item['price']) * item['quantity'] for item in cart.values())
-        order = Order.objects.create(user=request.user, total_price=total_price)
-        for pk, item in cart.items():
-            book = get_object_or_404(Book, pk=pk)
-            OrderItem.objects.create(
-                order=order,
-                book=book,
-                quantity=item['quantity'],
-                price=float(item['price'])
-            )
+    order, created = place_order(request.user, cart, token)
+    if created:
         request.session['cart'] = {}
+        request.session.pop(CHECKOUT_TOKEN_SESSION_KEY, None)
         messages.success(request, "Your order has been placed successfully!")
-        return redirect('book_list')
+    else:
+        # A replayed token, say from a second tab: the cart may have been refilled since, and nothing was bought
+        if request.session.get(CHECKOUT_TOKEN_SESSION_KEY) == str(token):
+            request.session.pop(CHECKOUT_TOKEN_SESSION_KEY)
+        messages.info(request, f"Order #{order.pk} has already been placed.")
+    return redirect('book_list')
 
 @login_required
 def order_history(request):
-    orders = Order.objects.filter(user=request.user).order_by('-order_date')
-    return render(request, 'books/order_history.html', {'orders': orders})
\ No newline at end of file
+    items = OrderItem.objects.select_related('book').only('order_id', 'quantity', 'price', 'book__title')
+    orders = (
+        Order.objects.filter(user=request.user)
+        .order_by('-order_date', '-pk')
+        .prefetch_related(Prefetch('orderitem_set', queryset=items, to_attr='lines'))
+    )
+    page = Paginator(orders, 10).get_page(request.GET.get('page'))
+    return render(request, 'books/order_history.html', {'orders': page, 'page_obj': page})
+
+@staff_member_required
+def cache_stats(request):
+    return JsonResponse(catalog_cache_stats())
+
+@staff_member_required
+def sales_report(request):
+    today = timezone.localdate()
+    try:
+        start = date.fromisoformat(request.GET.get('start', ''))
+    except ValueError:
+        start = today - timedelta(days=29)
+    try:
+        end = date.fromisoformat(request.GET.get('end', ''))
+    except ValueError:
+        end = today
+    context = {'start': start, 'end': end, **sales_summary(start, end)}
+    return render(request, 'books/sales_report.html', context)
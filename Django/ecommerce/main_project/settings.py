@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -44,7 +45,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'main_project.middleware.AsyncWhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -136,7 +137,63 @@ AUTH_USER_MODEL = 'users.User'
 STRIPE_PUBLISHABLE_KEY = 'pk_test_YOUR_PUBLISHABLE_KEY'
 STRIPE_SECRET_KEY = 'sk_test_YOUR_SECRET_KEY'
 STRIPE_WEBHOOK_SECRET = 'whsec_YOUR_WEBHOOK_SECRET' # Optional, for webhook security
+# Point at `manage.py stripe_stub` to run without network access
+STRIPE_API_BASE = os.environ.get('STRIPE_API_BASE', 'https://api.stripe.com')
+# Seconds; a checkout gives up on a slow Stripe response rather than tying up the worker
+STRIPE_TIMEOUT = 10
+STRIPE_CONNECT_TIMEOUT = 3
+STRIPE_MAX_NETWORK_RETRIES = 1
+# Order fulfillment queue drained by `manage.py fulfillment_worker`
+FULFILLMENT_MAX_ATTEMPTS = 5
+# Seconds before the first retry; each further attempt waits twice as long
+FULFILLMENT_RETRY_DELAY = 30
+# Seconds a worker holds a claimed job before another worker may take it over
+FULFILLMENT_LEASE_SECONDS = 300
+# Seconds a checkout holds its units; `manage.py release_expired_reservations` restocks them after that
+STOCK_RESERVATION_SECONDS = 35 * 60
+# Seconds before Stripe expires an unpaid checkout session; Stripe allows 30 minutes to 24 hours,
+# and it must end before the reservation does so nobody pays for units already back on sale
+STRIPE_SESSION_SECONDS = 30 * 60
 
 # dj-stripe Settings
 DJSTRIPE_WEBHOOK_SECRET = STRIPE_WEBHOOK_SECRET
 DJSTRIPE_FOREIGN_KEY_TO_FIELD = "id" # Or "uuid" if using UUIDField for User PK
+
+# Product listing
+PRODUCTS_PAGE_SIZE = 20
+PRODUCTS_MAX_PAGE_SIZE = 100
+PRODUCTS_EXCERPT_LENGTH = 200
+# 'exact' runs COUNT(*); 'estimate' reads the planner's row estimate for the unfiltered
+# catalog; 'none' never counts and only knows whether there is a next page
+PRODUCTS_COUNT_STRATEGY = 'exact'
+# Seconds before ?since= that the product feed reads again: updated_at is stamped when a
+# product is saved, not when that save commits, so a slow transaction can land behind it
+PRODUCTS_FEED_OVERLAP = 60
+
+# Holds the catalog version stamp behind the product API's ETags and the rendered
+# product fragments; `products/cache-stats/` reports the hit ratio. Locmem is
+# per process, so deployments running several workers want a shared backend
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'ecommerce',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+PRODUCTS_CACHE_ALIAS = 'default'
+# Seconds a rendered product fragment is kept; saving the product replaces it sooner
+PRODUCTS_FRAGMENT_TIMEOUT = 60 * 60
+
+# "Frequently bought together", rebuilt offline by `manage.py build_recommendations`
+PRODUCTS_RECOMMENDATION_LIMIT = 5
+# Pairings kept per product while counting; more is more accurate and uses more memory
+PRODUCTS_RECOMMENDATION_CANDIDATES = 50
+# Orders with more distinct products than this are skipped, as wholesale rather than a basket
+PRODUCTS_RECOMMENDATION_MAX_BASKET = 100
+# Order ids below the last run's newest that are read again, since an id can commit after higher ones
+PRODUCTS_RECOMMENDATION_OVERLAP = 1000
+
+# Product name autocomplete
+PRODUCTS_AUTOCOMPLETE_LIMIT = 10
+# Longest prefix the in-memory index can match; longer keys are truncated to save memory
+PRODUCTS_AUTOCOMPLETE_KEY_LENGTH = 32
@@ -20,5 +20,6 @@ from django.urls import path, include
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('products/', include('products.urls')),
+    path('api/v1/', include('products.api_urls')),
     path('accounts/', include('django.contrib.auth.urls')),
 ]
@@ -1,5 +1,15 @@
 from django.contrib import admin
 from .models import Product
 
-# Register your models here.
-admin.site.register(Product)
+
+@admin.register(Product)
+class ProductAdmin(admin.ModelAdmin):
+    def get_readonly_fields(self, request, obj=None):
+        # Stock moves with every checkout, so an edit must not write back the count it loaded
+        return ('stock',) if obj else ()
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            obj.save(update_fields=[*form.base_fields, 'updated_at'])
+        else:
+            obj.save()
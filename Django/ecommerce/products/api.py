@@ -0,0 +1,169 @@
+import base64
+import gzip
+import hashlib
+import re
+from datetime import datetime, timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils.dateparse import parse_datetime
+from django.utils.http import urlencode
+from django.views.decorators.http import condition, require_safe
+
+from . import catalog
+from .models import Product
+
+try:
+    import brotli
+except ImportError:  # Optional; without it responses are gzipped
+    brotli = None
+
+# Everything a client may ask for with ?fields=. Stock is left out: it changes
+# with every checkout, which would turn every ETag over within seconds
+FIELDS = ('id', 'name', 'description', 'price', 'updated_at')
+ACCEPT_ENCODING_RE = re.compile(r'([\w*-]+)\s*(?:;\s*q\s*=\s*([\d.]+))?')
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def negotiate_encoding(request):
+    """The content coding the response will use: 'br', 'gzip' or None."""
+    accepted = {}
+    for coding, quality in ACCEPT_ENCODING_RE.findall(request.headers.get('Accept-Encoding', '')):
+        try:
+            accepted[coding.lower()] = float(quality) if quality else 1.0
+        except ValueError:
+            continue
+    if brotli is not None and accepted.get('br', 0) > 0:
+        return 'br'
+    if accepted.get('gzip', 0) > 0:
+        return 'gzip'
+    return None
+
+
+def compress(view):
+    """Compress the body with the negotiated coding, whatever its size, so the ETag can be chosen up front."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = negotiate_encoding(request)
+        if encoding and response.status_code == 200 and not response.has_header('Content-Encoding'):
+            if encoding == 'br':
+                response.content = brotli.compress(response.content)
+            else:
+                # mtime=0 keeps identical bodies byte-identical, as a strong ETag promises
+                response.content = gzip.compress(response.content, mtime=0)
+            response.headers['Content-Encoding'] = encoding
+        return response
+    return wrapper
+
+
+def catalog_etag(request, *args, **kwargs):
+    """
+    A strong ETag from the catalog version and the query, without touching
+    the database. Each content coding is a different representation, so it
+    gets its own tag.
+    """
+    query = sorted(request.GET.lists())
+    digest = hashlib.md5(repr(query).encode()).hexdigest()[:16]
+    encoding = negotiate_encoding(request)
+    return f'{catalog.get_version()}-{digest}' + (f'-{encoding}' if encoding else '')
+
+
+def encode_cursor(updated_at, pk):
+    return base64.urlsafe_b64encode(f'{updated_at.isoformat()}|{pk}'.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        updated_at, pk = raw.split('|')
+        updated_at, pk = datetime.fromisoformat(updated_at), int(pk)
+    except ValueError:
+        raise BadRequest('Invalid cursor.')
+    # Cursors handed out always carry an offset
+    if timezone.is_naive(updated_at):
+        raise BadRequest('Invalid cursor.')
+    return updated_at, pk
+
+
+def parse_fields(value):
+    if not value:
+        return list(FIELDS)
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in FIELDS]
+    if unknown or not fields:
+        raise BadRequest(f"Unknown fields: {', '.join(unknown)}. Choose from {', '.join(FIELDS)}.")
+    return fields
+
+
+def parse_limit(value):
+    try:
+        limit = int(value or settings.PRODUCTS_PAGE_SIZE)
+    except ValueError:
+        limit = settings.PRODUCTS_PAGE_SIZE
+    return min(max(limit, 1), settings.PRODUCTS_MAX_PAGE_SIZE)
+
+
+def product_page(params):
+    """
+    One page of the catalog in (updated_at, id) order, which doubles as a
+    change feed: a client that passes the newest updated_at it has seen as
+    ?since= gets what changed after it, and follows ``next`` cursors through
+    the rest. Deleted products simply stop appearing.
+
+    updated_at is stamped when a product is saved rather than when the save
+    commits, so a product can commit with a time the client has already
+    passed. ?since= therefore reaches PRODUCTS_FEED_OVERLAP seconds further
+    back, and clients see some products twice; they should upsert by id.
+    """
+    fields = parse_fields(params.get('fields'))
+    limit = parse_limit(params.get('limit'))
+    products = Product.objects.order_by('updated_at', 'pk')
+    if params.get('since'):
+        try:
+            since = parse_datetime(params['since'])
+        except ValueError:
+            # Well formed but impossible, like month 13
+            since = None
+        if since is None:
+            raise BadRequest('since must be an ISO 8601 timestamp.')
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
+        products = products.filter(updated_at__gte=since - timedelta(seconds=settings.PRODUCTS_FEED_OVERLAP))
+    if params.get('cursor'):
+        updated_at, pk = decode_cursor(params['cursor'])
+        products = products.filter(Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, pk__gt=pk))
+    # One row past the page tells whether there is a next one
+    rows = list(products.values(*set(fields) | {'id', 'updated_at'})[:limit + 1])
+    has_next = len(rows) > limit
+    rows = rows[:limit]
+    results = [{field: row[field] for field in fields} for row in rows]
+    cursor = encode_cursor(rows[-1]['updated_at'], rows[-1]['id']) if has_next else None
+    return results, cursor
+
+
+@require_safe
+# No Last-Modified: at one second's resolution it would answer 304 for a change
+# made within the same second, and the ETag already covers every change
+@condition(etag_func=catalog_etag)
+@compress
+def product_feed(request):
+    try:
+        results, cursor = product_page(request.GET)
+    except BadRequest as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    next_url = None
+    if cursor:
+        params = {key: value for key, value in request.GET.items() if key != 'cursor'}
+        next_url = request.build_absolute_uri(f'{request.path}?{urlencode({**params, "cursor": cursor})}')
+    # Prices go out as strings so clients never round them through a float
+    return JsonResponse({'results': results, 'next': next_url}, encoder=DjangoJSONEncoder)
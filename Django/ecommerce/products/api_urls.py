@@ -0,0 +1,8 @@
+from django.urls import path
+
+from .api import product_feed
+
+# Mounted under api/v1/; a breaking change to the payload gets a new version prefix
+urlpatterns = [
+    path('products/', product_feed, name='api_product_list'),
+]
@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class ProductsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'products'
+
+    def ready(self):
+        import stripe
+        from django.conf import settings
+
+        from . import signals  # noqa: F401
+
+        # dj-stripe calls go through the module-level client
+        stripe.api_base = settings.STRIPE_API_BASE
@@ -0,0 +1,118 @@
+import re
+import threading
+from bisect import bisect_left
+
+from django.conf import settings
+
+from .models import Product
+
+WORD_START_RE = re.compile(r'\b\w')
+# Separates the indexed text from the pk, so every key is unique and sorts
+# before any longer text sharing the same prefix
+PK_SEPARATOR = '\x00'
+
+
+def normalize(text):
+    return ' '.join(text.lower().split())
+
+
+def index_keys(pk, name):
+    """One key per word in the name, holding the rest of the name from that word on."""
+    name = normalize(name)
+    limit = settings.PRODUCTS_AUTOCOMPLETE_KEY_LENGTH
+    keys = {f'{name[match.start():match.start() + limit]}{PK_SEPARATOR}{pk}' for match in WORD_START_RE.finditer(name)}
+    return sorted(keys)
+
+
+class PrefixIndex:
+    """
+    Sorted array of name keys searched with bisect. The pks live in a parallel
+    list and the names in a dict, so a lookup never touches the database.
+
+    Each process holds its own copy, built on its first lookup so processes
+    that never autocomplete never load it: saves made in this process are
+    applied straight away, other processes see them after their next rebuild.
+    """
+
+    def __init__(self):
+        self._keys = []
+        self._pks = []
+        self._names = {}
+        self._lock = threading.Lock()
+        # Held only while building, so lookups keep using the old arrays meanwhile
+        self._build_lock = threading.Lock()
+        self.ready = False
+
+    def build(self, rows=None):
+        """Rebuild from (pk, name) rows, or from the Product table if none are given."""
+        if rows is None:
+            rows = Product.objects.values_list('pk', 'name').iterator(chunk_size=10000)
+        names = {}
+        entries = []
+        for pk, name in rows:
+            names[pk] = name
+            entries.extend((key, pk) for key in index_keys(pk, name))
+        entries.sort()
+        keys = [key for key, pk in entries]
+        pks = [pk for key, pk in entries]
+        with self._lock:
+            self._keys, self._pks, self._names = keys, pks, names
+            self.ready = True
+
+    def _insert(self, pk, name):
+        for key in index_keys(pk, name):
+            position = bisect_left(self._keys, key)
+            self._keys.insert(position, key)
+            self._pks.insert(position, pk)
+        self._names[pk] = name
+
+    def _remove(self, pk):
+        name = self._names.pop(pk, None)
+        if name is None:
+            return
+        for key in index_keys(pk, name):
+            position = bisect_left(self._keys, key)
+            if position < len(self._keys) and self._keys[position] == key:
+                del self._keys[position]
+                del self._pks[position]
+
+    def update(self, pk, name):
+        with self._lock:
+            if self._names.get(pk) == name:
+                return
+            self._remove(pk)
+            self._insert(pk, name)
+
+    def remove(self, pk):
+        with self._lock:
+            self._remove(pk)
+
+    def complete(self, prefix, limit=10):
+        """Return up to ``limit`` (pk, name) pairs with a word starting with ``prefix``."""
+        prefix = normalize(prefix)[:settings.PRODUCTS_AUTOCOMPLETE_KEY_LENGTH]
+        if not prefix:
+            return []
+        if not self.ready:
+            # Concurrent first lookups wait for one build instead of each running their own
+            with self._build_lock:
+                if not self.ready:
+                    self.build()
+        results = []
+        seen = set()
+        with self._lock:
+            position = bisect_left(self._keys, prefix)
+            while position < len(self._keys) and len(results) < limit:
+                if not self._keys[position].startswith(prefix):
+                    break
+                pk = self._pks[position]
+                if pk not in seen:
+                    seen.add(pk)
+                    results.append((pk, self._names[pk]))
+                position += 1
+        return results
+
+    def __len__(self):
+        return len(self._names)
+
+
+index = PrefixIndex()
@@ -0,0 +1,37 @@
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+
+from .models import CartItem, Product
+
+
+def add_item(cart_id, product_id, quantity=1):
+    """
+    Add ``quantity`` of a product to a cart as a single upsert, so concurrent
+    adds never lose an increment. Returns False if the product does not exist.
+    """
+    if connection.vendor in ('sqlite', 'postgresql'):
+        # Selecting from the product table turns an unknown product into a no-op
+        # rather than a foreign key error, which PostgreSQL defers to commit
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {CartItem._meta.db_table} (cart_id, product_id, quantity) '
+                f'SELECT %s, id, %s FROM {Product._meta.db_table} WHERE id = %s '
+                'ON CONFLICT (cart_id, product_id) DO UPDATE SET quantity = '
+                f'{CartItem._meta.db_table}.quantity + excluded.quantity',
+                [cart_id, quantity, product_id],
+            )
+            return cursor.rowcount > 0
+
+    # Other databases: increment, and insert only when there was nothing to increment
+    items = CartItem.objects.filter(cart_id=cart_id, product_id=product_id)
+    if items.update(quantity=F('quantity') + quantity):
+        return True
+    if not Product.objects.filter(pk=product_id).exists():
+        return False
+    try:
+        with transaction.atomic():
+            CartItem.objects.create(cart_id=cart_id, product_id=product_id, quantity=quantity)
+    except IntegrityError:
+        # Another request inserted the row first
+        items.update(quantity=F('quantity') + quantity)
+    return True
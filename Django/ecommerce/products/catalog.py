@@ -0,0 +1,106 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+CATALOG_VERSION_KEY = 'products:catalog:version'
+HITS_KEY = 'products:fragments:hits'
+MISSES_KEY = 'products:fragments:misses'
+
+
+def get_cache():
+    return caches[settings.PRODUCTS_CACHE_ALIAS]
+
+
+def _now():
+    return int(time.time() * 1000)
+
+
+def get_version():
+    """
+    The catalog's version stamp: the time of its last change, in milliseconds.
+    An evicted stamp comes back as the current time, which can only make
+    clients fetch again, never keep something stale.
+    """
+    cache = get_cache()
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, _now(), timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump():
+    # Always moves forward, even for two changes within the same millisecond
+    get_cache().set(CATALOG_VERSION_KEY, max(_now(), get_version() + 1), timeout=None)
+
+
+def product_version_key(pk):
+    return f'products:product:{pk}:version'
+
+
+def get_product_versions(pks):
+    """
+    Each product's version, seeded from the clock so an evicted one never
+    repeats an old value. Missing versions are seeded with add, one per key,
+    so a bump landing at the same moment is never overwritten.
+    """
+    cache = get_cache()
+    keys = {pk: product_version_key(pk) for pk in pks}
+    versions = cache.get_many(keys.values())
+    missing = [key for key in keys.values() if key not in versions]
+    if missing:
+        now = _now()
+        for key in missing:
+            cache.add(key, now, timeout=None)
+        versions.update(cache.get_many(missing))
+    return {pk: versions[key] for pk, key in keys.items()}
+
+
+def bump_product(pk):
+    cache = get_cache()
+    try:
+        cache.incr(product_version_key(pk))
+    except ValueError:
+        cache.add(product_version_key(pk), _now(), timeout=None)
+
+
+def _record(key, count):
+    if not count:
+        return
+    cache = get_cache()
+    try:
+        cache.incr(key, count)
+    except ValueError:
+        cache.add(key, count, timeout=None)
+
+
+def stats():
+    counts = get_cache().get_many([HITS_KEY, MISSES_KEY])
+    hits, misses = counts.get(HITS_KEY, 0), counts.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_ratio': hits / total if total else 0.0}
+
+
+def cached_fragments(kind, products, render, catalog_version):
+    """
+    The rendered ``kind`` fragment of each product, in order. Cached ones
+    come back in two get_many round trips; only the rest are rendered.
+
+    ``catalog_version`` is get_version() as read before the products were
+    fetched. If it has moved by the time they are rendered, a save committed
+    in between and the rows may predate the versions, so the fragments are
+    served but not stored.
+    """
+    cache = get_cache()
+    versions = get_product_versions([product.pk for product in products])
+    keys = [f'products:fragment:{kind}:{product.pk}:{versions[product.pk]}' for product in products]
+    fragments = cache.get_many(keys)
+    rendered = {key: render(product) for key, product in zip(keys, products) if key not in fragments}
+    if rendered:
+        if get_version() == catalog_version:
+            cache.set_many(rendered, settings.PRODUCTS_FRAGMENT_TIMEOUT)
+        fragments.update(rendered)
+    _record(HITS_KEY, len(keys) - len(rendered))
+    _record(MISSES_KEY, len(rendered))
+    return [fragments[key] for key in keys]
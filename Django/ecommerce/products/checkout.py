@@ -0,0 +1,71 @@
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, PositiveIntegerField, Q, Value, When
+
+from . import stock
+from .models import CartItem, CheckoutLine, Order, OrderItem
+
+
+def record_session(session_id, lines, token=None):
+    """
+    Snapshot the cart lines a checkout session charges for, so the order is
+    built from what was paid rather than from the cart as it is later.
+    """
+    with transaction.atomic():
+        CheckoutLine.objects.bulk_create([
+            CheckoutLine(stripe_session_id=session_id, product_id=line.product_id,
+                         quantity=line.quantity, price=line.product.price)
+            for line in lines
+        ])
+        if token is not None:
+            stock.attach_session(token, session_id)
+
+
+def materialize_order(user, session_id):
+    """
+    Turn a paid Stripe checkout session into an order from the lines recorded
+    for it, and take those units out of the user's cart, with a fixed number
+    of queries.
+
+    Returns (order, created). A session that already produced an order returns
+    that order instead of creating a second one, including when two requests
+    race on the same session. A session with no recorded lines raises
+    ValueError rather than producing an empty order.
+    """
+    existing = Order.objects.filter(stripe_session_id=session_id).first()
+    if existing:
+        return existing, False
+    lines = list(CheckoutLine.objects.filter(stripe_session_id=session_id).order_by('pk'))
+    if not lines:
+        raise ValueError(f'No checkout lines were recorded for session {session_id}')
+    try:
+        with transaction.atomic():
+            # The units were taken from stock at checkout and now stay sold
+            in_stock = stock.convert(session_id, lines)
+            order = Order.objects.create(
+                user=user,
+                total_price=sum((line.price * line.quantity for line in lines), Decimal('0.00')),
+                shipping_address="Stripe Checkout", # Address will be handled by Stripe
+                is_paid=True,
+                stripe_session_id=session_id,
+                stock_shortfall=not in_stock,
+            )
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product_id=line.product_id, quantity=line.quantity, price=line.price)
+                for line in lines
+            ])
+            # Only the units that were paid for leave the cart, so anything added since stays
+            items = CartItem.objects.filter(cart__user=user)
+            items.filter(reduce(or_, (Q(product_id=line.product_id, quantity__lte=line.quantity) for line in lines))).delete()
+            items.filter(reduce(or_, (Q(product_id=line.product_id, quantity__gt=line.quantity) for line in lines))).update(
+                quantity=F('quantity') - Case(
+                    *(When(product_id=line.product_id, then=Value(line.quantity)) for line in lines),
+                    output_field=PositiveIntegerField(),
+                ),
+            )
+    except IntegrityError:
+        return Order.objects.get(stripe_session_id=session_id), False
+    return order, True
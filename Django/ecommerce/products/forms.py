@@ -7,12 +7,25 @@ class CustomUserCreationForm(UserCreationForm):
         fields = UserCreationForm.Meta.fields + ('email',)
 
 class SearchForm(forms.Form):
-    query = forms.CharField(label='Search', max_length=100)
+    query = forms.CharField(
+        label='Search',
+        max_length=100,
+        widget=forms.TextInput(attrs={'list': 'product-suggestions', 'autocomplete': 'off'}),
+    )
 
 class ProductForm(forms.ModelForm):
+    # No stock: saving a count read when the form opened would undo the
+    # reservations made since. Existing products change it with StockForm
     class Meta:
         model = Product
         fields = ['name', 'description', 'price']
 
+class NewProductForm(ProductForm):
+    class Meta(ProductForm.Meta):
+        fields = ProductForm.Meta.fields + ['stock']
+
+class StockForm(forms.Form):
+    change = forms.IntegerField(label='Add units', help_text='Negative to take units off sale.')
+
 class CheckoutForm(forms.Form):
     shipping_address = forms.CharField(widget=forms.Textarea, label='Shipping Address')
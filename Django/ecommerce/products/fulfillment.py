@@ -0,0 +1,86 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import stock
+from .checkout import materialize_order
+from .models import FulfillmentJob
+
+# Stripe sends these once a checkout session has actually been paid for
+PAID_EVENTS = ('checkout.session.completed', 'checkout.session.async_payment_succeeded')
+# ...and these once it can no longer be paid, which hands its reserved units back
+UNPAID_EVENTS = ('checkout.session.expired', 'checkout.session.async_payment_failed')
+
+
+def enqueue(session_id, user_id):
+    """Queue a paid session. Stripe retries webhooks, so a repeat is a no-op."""
+    job, created = FulfillmentJob.objects.get_or_create(stripe_session_id=session_id, defaults={'user_id': user_id})
+    return job, created
+
+
+def handle_event(event):
+    """Queue fulfillment for a verified Stripe event. Returns the job, or None if there is nothing to do."""
+    session = event['data']['object']
+    if event['type'] in UNPAID_EVENTS:
+        stock.release(stripe_session_id=session['id'])
+        return None
+    if event['type'] not in PAID_EVENTS:
+        return None
+    if session.get('payment_status') != 'paid' or not session.get('client_reference_id'):
+        return None
+    try:
+        user_id = int(session['client_reference_id'])
+    except ValueError:
+        return None
+    job, created = enqueue(session['id'], user_id)
+    return job
+
+
+def claim(batch_size):
+    """
+    Lease up to ``batch_size`` due jobs to this worker. A worker that dies
+    mid-batch leaves its jobs to be claimed again once the lease runs out.
+    """
+    now = timezone.now()
+    lease = now + timedelta(seconds=settings.FULFILLMENT_LEASE_SECONDS)
+    with transaction.atomic():
+        due = (
+            FulfillmentJob.objects.filter(status=FulfillmentJob.PENDING, run_after__lte=now)
+            .exclude(locked_until__gt=now)
+            .order_by('run_after', 'pk')
+        )
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        pks = list(due.values_list('pk', flat=True)[:batch_size])
+        FulfillmentJob.objects.filter(pk__in=pks).update(locked_until=lease, attempts=F('attempts') + 1)
+    return list(FulfillmentJob.objects.filter(pk__in=pks).select_related('user').order_by('run_after', 'pk'))
+
+
+def run(job):
+    """Place the order for one claimed job, rescheduling it with backoff if that fails."""
+    try:
+        materialize_order(job.user, job.stripe_session_id)
+    except Exception as e:
+        if job.attempts >= settings.FULFILLMENT_MAX_ATTEMPTS:
+            job.status = FulfillmentJob.FAILED
+        else:
+            delay = settings.FULFILLMENT_RETRY_DELAY * 2 ** (job.attempts - 1)
+            job.run_after = timezone.now() + timedelta(seconds=delay)
+        job.last_error = f'{type(e).__name__}: {e}'
+        job.locked_until = None
+        job.save(update_fields=['status', 'run_after', 'locked_until', 'last_error', 'updated_at'])
+        return False
+    job.status = FulfillmentJob.DONE
+    job.locked_until = None
+    job.last_error = ''
+    job.save(update_fields=['status', 'locked_until', 'last_error', 'updated_at'])
+    return True
+
+
+def work(batch_size=50):
+    """Claim and run one batch. Returns (succeeded, failed)."""
+    results = [run(job) for job in claim(batch_size)]
+    return results.count(True), results.count(False)
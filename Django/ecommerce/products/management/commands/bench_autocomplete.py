@@ -0,0 +1,103 @@
+import gc
+import os
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from products.autocomplete import PrefixIndex
+from products.models import Product
+
+WORDS = ('brass', 'linen', 'oak', 'walnut', 'copper', 'velvet', 'desk', 'lamp', 'shade', 'chair',
+         'stool', 'table', 'cushion', 'shelf', 'mirror', 'clock', 'vase', 'rug', 'basket', 'bench')
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(int(len(samples) * fraction), len(samples) - 1)]
+
+
+def timed(function, prefixes):
+    samples = []
+    for prefix in prefixes:
+        started = time.perf_counter()
+        function(prefix)
+        samples.append((time.perf_counter() - started) * 1_000_000)
+    return {
+        'p50_us': round(statistics.median(samples), 1),
+        'p99_us': round(percentile(samples, 0.99), 1),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway database with synthetic product names and compare the in-memory '
+        'autocomplete index with the name__icontains query.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--names', type=int, default=100_000, help='Number of products to seed.')
+        parser.add_argument('--queries', type=int, default=1000, help='Number of prefixes to look up.')
+        parser.add_argument('--limit', type=int, default=10, help='Matches returned per lookup.')
+        parser.add_argument('--db-path', help='SQLite file for the benchmark database (default: a temp file).')
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        names = [
+            ' '.join(rng.choice(WORDS).title() for _ in range(3)) + f' {i}'
+            for i in range(options['names'])
+        ]
+        prefixes = [rng.choice(WORDS)[:rng.randint(1, 4)] for _ in range(options['queries'])]
+        limit = options['limit']
+
+        temp_dir = None
+        if connection.vendor == 'sqlite':
+            if not options['db_path']:
+                temp_dir = tempfile.mkdtemp()
+            connection.settings_dict['TEST']['NAME'] = options['db_path'] or os.path.join(temp_dir, 'bench.sqlite3')
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.stdout.write(f'Seeding {len(names)} products...')
+            with transaction.atomic():
+                Product.objects.bulk_create(
+                    (Product(name=name, description='', price=Decimal('9.99')) for name in names),
+                    batch_size=5000,
+                )
+
+            gc.collect()
+            tracemalloc.start()
+            started = time.perf_counter()
+            index = PrefixIndex()
+            index.build()
+            build_seconds = time.perf_counter() - started
+            memory, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            results = {
+                'index': timed(lambda prefix: index.complete(prefix, limit), prefixes),
+                'icontains': timed(
+                    lambda prefix: list(Product.objects.filter(name__icontains=prefix).values_list('pk', 'name')[:limit]),
+                    prefixes,
+                ),
+            }
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            if temp_dir:
+                os.rmdir(temp_dir)
+
+        self.stdout.write(
+            f'Index of {len(index)} names built in {build_seconds:.2f}s: '
+            f'{memory / 2**20:.1f} MiB resident, {peak / 2**20:.1f} MiB peak while building.'
+        )
+        self.stdout.write(f"{'path':<12}{'p50 us':>12}{'p99 us':>12}")
+        for path, row in results.items():
+            self.stdout.write(f"{path:<12}{row['p50_us']:>12}{row['p99_us']:>12}")
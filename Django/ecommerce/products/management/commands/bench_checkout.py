@@ -0,0 +1,114 @@
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from unittest import mock
+
+import stripe
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import AsyncClient, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from products.models import Cart, CartItem, Product
+from products.stripe_stub import StripeStub
+
+PASSWORD = 'bench-password'
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(int(len(samples) * fraction), len(samples) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway database, serve Stripe from the local stub with injected latency '
+        'and time concurrent checkout requests. Runs offline.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--latency-ms', type=float, default=200.0, help='Stripe stub response time.')
+        parser.add_argument('--concurrency', type=int, default=20, help='Number of concurrent shoppers.')
+        parser.add_argument('--requests', type=int, default=200, help='Total checkout requests.')
+        parser.add_argument('--method', choices=('get', 'post'), default='post',
+                            help='GET renders the checkout page, POST creates a Stripe session.')
+        parser.add_argument('--cold', action='store_true',
+                            help="Include each shopper's first visit in the timings instead of warming up.")
+
+    def handle(self, *args, **options):
+        temp_dir = None
+        if connection.vendor == 'sqlite':
+            temp_dir = tempfile.mkdtemp()
+            connection.settings_dict['TEST']['NAME'] = os.path.join(temp_dir, 'bench.sqlite3')
+
+        stub = StripeStub(latency=options['latency_ms'] / 1000).start()
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(STRIPE_API_BASE=stub.url), mock.patch.object(stripe, 'api_base', stub.url):
+                users = self.seed(options['concurrency'])
+                results = async_to_sync(self.drive)(users, options['requests'], options['method'], options['cold'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            stub.stop()
+            if temp_dir:
+                os.rmdir(temp_dir)
+
+        samples, failures, elapsed = results
+        self.stdout.write(
+            f"{options['method'].upper()} /checkout/ x {len(samples)} with {options['concurrency']} shoppers, "
+            f"Stripe stub at {options['latency_ms']:.0f} ms{', cold' if options['cold'] else ''}"
+        )
+        if samples:
+            self.stdout.write(
+                f'p50 {statistics.median(samples):.1f} ms  p95 {percentile(samples, 0.95):.1f} ms  '
+                f'p99 {percentile(samples, 0.99):.1f} ms  {len(samples) / elapsed:.1f} req/s'
+            )
+        for failure in failures[:10]:
+            self.stderr.write(failure)
+
+    def seed(self, count):
+        User = get_user_model()
+        product = Product.objects.create(name='Bench product', description='', price='9.99')
+        users = []
+        for i in range(count):
+            user = User.objects.create_user(username=f'bench{i}', password=PASSWORD)
+            cart = Cart.objects.create(user=user)
+            CartItem.objects.create(cart=cart, product=product, quantity=1)
+            users.append(user)
+        return users
+
+    async def drive(self, users, total, method, cold=False):
+        clients = []
+        for user in users:
+            client = AsyncClient()
+            await client.aforce_login(user)
+            if not cold:
+                # Keep one-off work, like creating the Stripe customer on the first POST, out of the timings
+                await getattr(client, method)(reverse('checkout'))
+            clients.append(client)
+
+        expected = 303 if method == 'post' else 200
+        samples, failures = [], []
+        queue = asyncio.Queue()
+        for i in range(total):
+            queue.put_nowait(i)
+
+        async def shopper(client):
+            while not queue.empty():
+                queue.get_nowait()
+                started = time.perf_counter()
+                response = await getattr(client, method)(reverse('checkout'))
+                samples.append((time.perf_counter() - started) * 1000)
+                if response.status_code != expected:
+                    failures.append(f'{method.upper()} /checkout/ returned {response.status_code}')
+
+        started = time.perf_counter()
+        await asyncio.gather(*(shopper(client) for client in clients))
+        return samples, failures, time.perf_counter() - started
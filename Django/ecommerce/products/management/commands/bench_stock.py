@@ -0,0 +1,105 @@
+import os
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Sum
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from products import stock
+from products.models import Cart, CartItem, Product, StockReservation
+
+from .bench_checkout import percentile
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway database with one product and have concurrent buyers reserve it '
+        'at checkout, then check that no unit was sold twice.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--buyers', type=int, default=200, help='Number of concurrent buyers.')
+        parser.add_argument('--stock', type=int, default=50, help='Units of the product on sale.')
+        parser.add_argument('--quantity', type=int, default=1, help='Units each buyer wants.')
+
+    def handle(self, *args, **options):
+        temp_dir = None
+        if connection.vendor == 'sqlite':
+            # Threads need a database file they can all open; IMMEDIATE transactions
+            # make writers queue on the busy timeout instead of failing on upgrade
+            temp_dir = tempfile.mkdtemp()
+            connection.settings_dict['TEST']['NAME'] = os.path.join(temp_dir, 'bench.sqlite3')
+            connection.settings_dict['OPTIONS'].update(
+                timeout=60, transaction_mode='IMMEDIATE', init_command='PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL',
+            )
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            product, buyers = self.seed(options['buyers'], options['stock'], options['quantity'])
+            samples, sold, elapsed = self.drive(buyers)
+            stock_left = Product.objects.get(pk=product.pk).stock
+            held = StockReservation.objects.filter(product=product).aggregate(units=Sum('quantity'))['units'] or 0
+            # Let every hold lapse and have the sweeper hand the units back
+            StockReservation.objects.update(expires_at=timezone.now())
+            while stock.release_expired(100):
+                pass
+            restocked = Product.objects.get(pk=product.pk).stock
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            if temp_dir:
+                os.rmdir(temp_dir)
+
+        units = sold * options['quantity']
+        self.stdout.write(
+            f"{options['buyers']} buyers x {options['quantity']} unit(s) of one product with {options['stock']} in stock"
+        )
+        self.stdout.write(
+            f'p50 {statistics.median(samples):.1f} ms  p95 {percentile(samples, 0.95):.1f} ms  '
+            f'p99 {percentile(samples, 0.99):.1f} ms  {len(samples) / elapsed:.1f} reservations/s'
+        )
+        self.stdout.write(
+            f'{sold} buyers got stock, {len(samples) - sold} were turned away; '
+            f'{units} units reserved, {held} held, {stock_left} left, {restocked} after the sweep'
+        )
+        oversold = units + stock_left - options['stock']
+        if oversold or held != units or restocked != options['stock']:
+            self.stderr.write(f'Stock does not add up: {oversold} units oversold')
+        else:
+            self.stdout.write('No units oversold.')
+
+    def seed(self, count, units, quantity):
+        User = get_user_model()
+        product = Product.objects.create(name='Bench product', description='', price='9.99', stock=units)
+        users = User.objects.bulk_create([User(username=f'bench{i}') for i in range(count)])
+        carts = Cart.objects.bulk_create([Cart(user=user) for user in users])
+        CartItem.objects.bulk_create([CartItem(cart=cart, product=product, quantity=quantity) for cart in carts])
+        return product, [(user, cart.get_lines()) for user, cart in zip(users, carts)]
+
+    def drive(self, buyers):
+        barrier = threading.Barrier(len(buyers))
+
+        def buy(buyer):
+            user, lines = buyer
+            connection.ensure_connection()
+            barrier.wait()
+            try:
+                started = time.perf_counter()
+                token, sold_out = stock.reserve(user, lines)
+                return (time.perf_counter() - started) * 1000, not sold_out
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(buyers)) as executor:
+            results = list(executor.map(buy, buyers))
+        elapsed = time.perf_counter() - started
+        return [ms for ms, ok in results], sum(ok for ms, ok in results), elapsed
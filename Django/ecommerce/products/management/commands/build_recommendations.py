@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from products import recommendations
+
+
+class Command(BaseCommand):
+    help = 'Count which products are bought together and store each product\'s "frequently bought together" list.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Recount every order instead of only the new ones.')
+        parser.add_argument('--workers', type=int, default=1, help='Processes counting order ranges in parallel.')
+        parser.add_argument('--chunk-size', type=int, default=10000, help='Order ids per counted range.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        run = recommendations.build(options['full'], options['workers'], options['chunk_size'])
+        if run is None:
+            self.stdout.write('No new orders.')
+            return
+        self.stdout.write(
+            f"Read {run.orders} orders up to #{run.last_order_id} "
+            f"({'full' if run.full else 'incremental'}) in {time.perf_counter() - started:.1f}s."
+        )
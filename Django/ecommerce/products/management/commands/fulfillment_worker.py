@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from products import fulfillment
+
+
+class Command(BaseCommand):
+    help = 'Turn paid Stripe checkout sessions queued by the webhook into orders.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50, help='Jobs claimed per round trip.')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to sleep when the queue is empty.')
+        parser.add_argument('--once', action='store_true', help='Drain the queue once and exit.')
+
+    def handle(self, *args, **options):
+        while True:
+            succeeded, failed = fulfillment.work(options['batch_size'])
+            if succeeded or failed:
+                self.stdout.write(f'Fulfilled {succeeded} orders, {failed} failed.')
+                continue
+            if options['once']:
+                return
+            time.sleep(options['poll_interval'])
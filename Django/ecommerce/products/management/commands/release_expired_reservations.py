@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from products import stock
+
+
+class Command(BaseCommand):
+    help = 'Put the units of expired checkout reservations back on sale.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Reservations released per transaction.')
+        parser.add_argument('--poll-interval', type=float, default=60.0, help='Seconds to sleep when nothing has expired.')
+        parser.add_argument('--once', action='store_true', help='Release what has expired so far and exit.')
+
+    def handle(self, *args, **options):
+        while True:
+            released = stock.release_expired(options['batch_size'])
+            if released:
+                self.stdout.write(f'Released {released} reservations.')
+                continue
+            if options['once']:
+                return
+            time.sleep(options['poll_interval'])
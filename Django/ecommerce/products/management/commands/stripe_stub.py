@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from products.stripe_stub import StripeStub
+
+
+class Command(BaseCommand):
+    help = 'Serve a local stand-in for the Stripe API. Point STRIPE_API_BASE at the printed URL.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=12111)
+        parser.add_argument('--latency-ms', type=float, default=0.0, help='Delay added to every response.')
+        parser.add_argument('--jitter-ms', type=float, default=0.0, help='Extra random delay of up to this much.')
+        parser.add_argument('--payment-status', default='paid', help='payment_status reported for retrieved sessions.')
+
+    def handle(self, *args, **options):
+        stub = StripeStub(
+            host=options['host'],
+            port=options['port'],
+            latency=options['latency_ms'] / 1000,
+            jitter=options['jitter_ms'] / 1000,
+            payment_status=options['payment_status'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Stripe stub listening on {stub.url}'))
+        try:
+            stub.serve_forever()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,57 @@
+import asyncio
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from djstripe.models import Customer
+from djstripe.settings import djstripe_settings
+
+from products.payments import create_stripe_customer, stripe_client
+
+
+class Command(BaseCommand):
+    help = (
+        'Fill in User.stripe_customer_id: first from customers dj-stripe already knows about, '
+        'then by creating the missing ones on Stripe in concurrent batches.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50, help='Customers created concurrently per batch.')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        missing = User.objects.filter(stripe_customer_id__isnull=True)
+
+        known = dict(
+            Customer.objects.filter(subscriber__in=missing, livemode=djstripe_settings.STRIPE_LIVE_MODE)
+            .values_list('subscriber_id', 'id')
+        )
+        linked = [User(pk=pk, stripe_customer_id=customer_id) for pk, customer_id in known.items()]
+        User.objects.bulk_update(linked, ['stripe_customer_id'], batch_size=1000)
+
+        created = failed = 0
+        last_pk = 0
+        while True:
+            batch = list(missing.filter(pk__gt=last_pk).order_by('pk')[:options['batch_size']])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            results = async_to_sync(self.create_batch)(batch)
+            users = []
+            for user, result in zip(batch, results):
+                if isinstance(result, Exception):
+                    failed += 1
+                    self.stderr.write(f'User {user.pk}: {result}')
+                else:
+                    user.stripe_customer_id = result
+                    users.append(user)
+            User.objects.bulk_update(users, ['stripe_customer_id'])
+            created += len(users)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Linked {len(linked)} existing customers, created {created}, {failed} failed.'
+        ))
+
+    async def create_batch(self, users):
+        async with stripe_client():
+            return await asyncio.gather(*(create_stripe_customer(user) for user in users), return_exceptions=True)
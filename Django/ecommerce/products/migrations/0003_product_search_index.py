@@ -0,0 +1,62 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE products_product_fts USING fts5('
+            "name, description, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE products_product_fts_vocab USING fts5vocab(products_product_fts, 'row')"
+        )
+        schema_editor.execute(
+            'INSERT INTO products_product_fts (rowid, name, description) '
+            'SELECT id, name, description FROM products_product'
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        schema_editor.execute(
+            'CREATE TABLE products_product_search ('
+            'product_id bigint PRIMARY KEY REFERENCES products_product (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+            'document tsvector NOT NULL)'
+        )
+        schema_editor.execute(
+            'CREATE INDEX products_product_search_document_idx ON products_product_search USING GIN (document)'
+        )
+        schema_editor.execute('CREATE TABLE products_product_words (word text PRIMARY KEY)')
+        schema_editor.execute(
+            'CREATE INDEX products_product_words_trgm_idx ON products_product_words USING GIN (word gin_trgm_ops)'
+        )
+        schema_editor.execute(
+            'INSERT INTO products_product_search (product_id, document) '
+            "SELECT p.id, setweight(to_tsvector('simple', p.name), 'A') || "
+            "setweight(to_tsvector('simple', p.description), 'B') "
+            'FROM products_product p'
+        )
+        schema_editor.execute(
+            'INSERT INTO products_product_words (word) '
+            'SELECT DISTINCT (unnest(document)).lexeme FROM products_product_search'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS products_product_fts_vocab')
+        schema_editor.execute('DROP TABLE IF EXISTS products_product_fts')
+    elif vendor == 'postgresql':
+        schema_editor.execute('DROP TABLE IF EXISTS products_product_words')
+        schema_editor.execute('DROP TABLE IF EXISTS products_product_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 00:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_checkoutline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='stock_shortfall',
+            field=models.BooleanField(default=False),
+        ),
+    ]
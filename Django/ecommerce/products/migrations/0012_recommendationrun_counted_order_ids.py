@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 01:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0011_order_stock_shortfall'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recommendationrun',
+            name='counted_order_ids',
+            field=models.JSONField(default=list),
+        ),
+    ]
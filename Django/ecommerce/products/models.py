@@ -1,10 +1,24 @@
+from decimal import Decimal
+
 from django.db import models
+from django.db.models import F, Sum
 from django.conf import settings
 
+LINE_TOTAL = F('quantity') * F('product__price')
+
 class Product(models.Model):
     name = models.CharField(max_length=200)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
+    # Units left to sell, not counting live reservations; blank means stock is not tracked
+    stock = models.PositiveIntegerField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # The catalog API pages through changes in this order
+            models.Index(fields=['updated_at', 'id'], name='product_updated_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -18,13 +32,22 @@ class Cart(models.Model):
         return f"Cart of {self.user.username}"
 
     def get_total_price(self):
-        return sum(item.get_total_price() for item in self.items.all())
+        return self.items.aggregate(total=Sum(LINE_TOTAL))['total'] or Decimal('0.00')
+
+    def get_lines(self):
+        """Items with their products and a ``line_total`` annotation, in one query."""
+        return list(self.items.select_related('product').annotate(line_total=LINE_TOTAL).order_by('pk'))
 
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'product'], name='unique_cart_product'),
+        ]
+
     def __str__(self):
         return f"{self.quantity} x {self.product.name} in {self.cart.user.username}'s cart"
 
@@ -37,6 +60,9 @@ class Order(models.Model):
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
     shipping_address = models.TextField()
     is_paid = models.BooleanField(default=False) # New field
+    stripe_session_id = models.CharField(max_length=255, unique=True, null=True, blank=True, editable=False)
+    # Paid for after its stock hold lapsed, when the units had meanwhile sold out
+    stock_shortfall = models.BooleanField(default=False)
 
     def __str__(self):
         return f"Order {self.id} by {self.user.username}"
@@ -51,4 +77,86 @@ class OrderItem(models.Model):
         return f"{self.quantity} x {self.product.name} in Order {self.order.id}"
 
     def get_total_price(self):
-        return self.quantity * self.price
\ No newline at end of file
+        return self.quantity * self.price
+
+class CheckoutLine(models.Model):
+    """One line a Stripe checkout session charged for, recorded when the session is created."""
+
+    stripe_session_id = models.CharField(max_length=255, db_index=True)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField()
+    price = models.DecimalField(max_digits=10, decimal_places=2) # Unit price sent to Stripe
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} in {self.stripe_session_id}"
+
+class ProductRecommendation(models.Model):
+    """A product often bought in the same order as ``product``, written by `manage.py build_recommendations`."""
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommendations')
+    recommended = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    score = models.PositiveIntegerField() # Orders that contained both
+
+    class Meta:
+        indexes = [
+            # Serves a product's recommendations, best first, from the index alone
+            models.Index(fields=['product', '-score', 'recommended'], name='recommendation_lookup_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.recommended_id} for {self.product_id} ({self.score})"
+
+class RecommendationRun(models.Model):
+    """How far `manage.py build_recommendations` got, so the next run only reads newer orders."""
+
+    last_order_id = models.PositiveIntegerField()
+    # Orders already counted among the last PRODUCTS_RECOMMENDATION_OVERLAP ids,
+    # which the next run reads again in case an earlier id committed late
+    counted_order_ids = models.JSONField(default=list)
+    orders = models.PositiveIntegerField()
+    full = models.BooleanField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Recommendations up to order {self.last_order_id}"
+
+class StockReservation(models.Model):
+    """Units taken out of stock at checkout, held until the order is placed or the hold expires."""
+
+    token = models.UUIDField(db_index=True, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField()
+    stripe_session_id = models.CharField(max_length=255, null=True, blank=True, db_index=True)
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} held for {self.user_id} until {self.expires_at}"
+
+class FulfillmentJob(models.Model):
+    """A paid Stripe checkout session waiting to be turned into an order."""
+
+    PENDING = 'pending'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    stripe_session_id = models.CharField(max_length=255, unique=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    run_after = models.DateTimeField(auto_now_add=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='fulfillmentjob_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"Fulfillment of {self.stripe_session_id} ({self.status})"
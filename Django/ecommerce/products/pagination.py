@@ -0,0 +1,119 @@
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
+from django.db.models import Max
+from django.utils.functional import cached_property
+
+
+class NoCountPage(Page):
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+    def next_page_number(self):
+        if not self._has_next:
+            raise EmptyPage('That page contains no results')
+        return self.number + 1
+
+    def previous_page_number(self):
+        if self.number <= 1:
+            raise EmptyPage('That page number is less than 1')
+        return self.number - 1
+
+    def end_index(self):
+        return self.start_index() + len(self.object_list) - 1 if self.object_list else 0
+
+
+class NoCountPaginator(Paginator):
+    """Never counts: fetches one extra row to find out whether a next page exists."""
+
+    count = None
+    num_pages = None
+
+    def validate_number(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That page number is not an integer')
+        if number < 1:
+            raise EmptyPage('That page number is less than 1')
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage('That page contains no results')
+        return NoCountPage(rows[:self.per_page], number, self, has_next=len(rows) > self.per_page)
+
+    @property
+    def page_range(self):
+        return []
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Uses the database's cheap row estimate instead of COUNT(*) when listing a
+    whole table. Filtered listings still get an exact count.
+
+    The estimate only labels the pages. Whether a page exists and has a next
+    one comes from fetching one row past it, and what a page turns out to
+    hold corrects the estimate, so deleted rows never lead to empty pages.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if queryset.query.where:
+            return super().count
+        estimate = self._estimate(queryset)
+        return super().count if estimate is None else estimate
+
+    @property
+    def is_estimated(self):
+        return not self.object_list.query.where
+
+    def validate_number(self, number):
+        if not self.is_estimated:
+            return super().validate_number(number)
+        return NoCountPaginator.validate_number(self, number)
+
+    def page(self, number):
+        if not self.is_estimated:
+            return super().page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage('That page contains no results')
+        has_next = len(rows) > self.per_page
+        seen = bottom + len(rows)
+        if not has_next or seen > self.count:
+            # The last page pins the real count; a page past an underestimate raises it
+            self.__dict__['count'] = seen if not has_next else max(self.count, seen)
+            self.__dict__.pop('num_pages', None)
+        return NoCountPage(rows[:self.per_page], number, self, has_next=has_next)
+
+    def _estimate(self, queryset):
+        model = queryset.model
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [model._meta.db_table])
+                row = cursor.fetchone()
+            # reltuples is -1 (or 0) until the table has been analyzed
+            return row[0] if row and row[0] > 0 else None
+        if connection.vendor == 'sqlite':
+            # The largest rowid is a single index probe; deleted rows make it an overestimate
+            return model._default_manager.using(queryset.db).aggregate(n=Max('pk'))['n'] or 0
+        return None
+
+
+PAGINATORS = {
+    'exact': Paginator,
+    'estimate': EstimatedCountPaginator,
+    'none': NoCountPaginator,
+}
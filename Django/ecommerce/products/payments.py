@@ -0,0 +1,125 @@
+import asyncio
+import time
+import weakref
+from contextlib import asynccontextmanager
+
+import httpx
+import stripe
+from asgiref.sync import AsyncToSync
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from djstripe.models import Customer
+from djstripe.settings import djstripe_settings
+
+# httpx connection pools belong to the event loop that opened them, so there is
+# one client per loop. Under ASGI that loop lives as long as the process and so
+# does its client. Under WSGI, async_to_sync opens a loop for a single call, and
+# a client cached against it would keep the loop and its sockets alive, so the
+# client is closed when the last block using it ends.
+_clients = weakref.WeakKeyDictionary()
+_borrowers = {}
+
+
+def _new_client():
+    timeout = httpx.Timeout(settings.STRIPE_TIMEOUT, connect=settings.STRIPE_CONNECT_TIMEOUT)
+    http_client = stripe.HTTPXClient(timeout=timeout)
+    client = stripe.StripeClient(
+        settings.STRIPE_SECRET_KEY,
+        base_addresses={'api': settings.STRIPE_API_BASE},
+        http_client=http_client,
+        max_network_retries=settings.STRIPE_MAX_NETWORK_RETRIES,
+    )
+    return client, http_client
+
+
+@asynccontextmanager
+async def stripe_client():
+    """
+    The StripeClient for the running event loop. It keeps its connections
+    alive between calls and gives up after the configured timeouts instead of
+    holding on to a slow Stripe response. Nested blocks share one client, so
+    wrapping several calls in one block pools them even under WSGI.
+    """
+    loop = asyncio.get_running_loop()
+    if loop not in _clients:
+        _clients[loop] = _new_client()
+    client, http_client = _clients[loop]
+    # async_to_sync registers the loops it opens for one call here
+    if loop not in AsyncToSync.loop_thread_executors:
+        yield client
+        return
+    _borrowers[loop] = _borrowers.get(loop, 0) + 1
+    try:
+        yield client
+    finally:
+        _borrowers[loop] -= 1
+        if not _borrowers[loop]:
+            del _borrowers[loop], _clients[loop]
+            await http_client.close_async()
+
+
+def line_items(lines):
+    return [
+        {
+            'price_data': {
+                'currency': 'usd',
+                'product_data': {
+                    'name': line.product.name,
+                },
+                'unit_amount': int(line.product.price * 100), # Stripe expects amount in cents
+            },
+            'quantity': line.quantity,
+        }
+        for line in lines
+    ]
+
+
+async def create_checkout_session(lines, success_url, cancel_url, client_reference_id, customer=None):
+    # client_reference_id comes back in the webhook, which is how fulfillment finds the buyer
+    params = {
+        'line_items': line_items(lines),
+        'mode': 'payment',
+        'success_url': success_url,
+        'cancel_url': cancel_url,
+        'client_reference_id': client_reference_id,
+        # Unpaid sessions close before their stock reservation runs out
+        'expires_at': int(time.time()) + settings.STRIPE_SESSION_SECONDS,
+    }
+    if customer:
+        params['customer'] = customer
+    async with stripe_client() as client:
+        return await client.v1.checkout.sessions.create_async(params=params)
+
+
+async def create_stripe_customer(user):
+    """
+    Create the Stripe customer for a user and return its id. The idempotency
+    key makes Stripe hand back the same customer if this runs twice.
+    """
+    async with stripe_client() as client:
+        customer = await client.v1.customers.create_async(
+            params={'email': user.email, 'name': user.get_full_name(), 'metadata': {'user_id': str(user.pk)}},
+            options={'idempotency_key': f'customer-create-{user.pk}'},
+        )
+    return customer.id
+
+
+async def create_customer(user):
+    """
+    Store the user's Stripe customer, adopting the one dj-stripe already
+    knows about and only creating one when there is none. Returns the id
+    that ended up stored.
+    """
+    customer_id = await (
+        Customer.objects.filter(subscriber=user, livemode=djstripe_settings.STRIPE_LIVE_MODE)
+        .values_list('id', flat=True)
+        .afirst()
+    )
+    if customer_id is None:
+        customer_id = await create_stripe_customer(user)
+    users = get_user_model().objects.filter(pk=user.pk)
+    # Whichever request stores an id first wins; the others adopt it
+    if not await users.filter(stripe_customer_id__isnull=True).aupdate(stripe_customer_id=customer_id):
+        customer_id = await users.values_list('stripe_customer_id', flat=True).aget()
+    user.stripe_customer_id = customer_id
+    return customer_id
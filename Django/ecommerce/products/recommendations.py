@@ -0,0 +1,163 @@
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+from operator import itemgetter
+
+import django
+from django.apps import apps
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Max
+
+from .models import Order, OrderItem, ProductRecommendation, RecommendationRun
+
+# Products per query when reading and replacing stored recommendations
+WRITE_BATCH = 500
+
+
+def stream_baskets(after_order_id, last_order_id, skip=frozenset()):
+    """
+    The set of product ids in each order in (after_order_id, last_order_id],
+    one order at a time, leaving out the order ids in ``skip``.
+    """
+    items = (
+        OrderItem.objects.filter(order_id__gt=after_order_id, order_id__lte=last_order_id)
+        .order_by('order_id')
+        .values_list('order_id', 'product_id')
+        .iterator(chunk_size=5000)
+    )
+    for order_id, rows in groupby(items, key=itemgetter(0)):
+        if order_id not in skip:
+            yield {product_id for order_id, product_id in rows}
+
+
+def trim(others, size):
+    """The ``size`` strongest pairings, ties going to the lower product id so runs are repeatable."""
+    return Counter(dict(sorted(others.items(), key=lambda item: (-item[1], item[0]))[:size]))
+
+
+def count_pairs(after_order_id, last_order_id, skip=frozenset()):
+    """
+    Count how often each pair of products shares an order, leaving out the
+    order ids in ``skip``. Returns
+    ({product_id: Counter({other_id: orders})}, orders read).
+
+    A product's counter is trimmed back to PRODUCTS_RECOMMENDATION_CANDIDATES
+    whenever it grows to twice that, so memory stays bounded however long the
+    history. A pairing trimmed early can lose counts it would otherwise have
+    kept; the cap is there to make that rare for anything near the top.
+    """
+    candidates = settings.PRODUCTS_RECOMMENDATION_CANDIDATES
+    max_basket = settings.PRODUCTS_RECOMMENDATION_MAX_BASKET
+    counts = defaultdict(Counter)
+    orders = 0
+    for basket in stream_baskets(after_order_id, last_order_id, skip):
+        orders += 1
+        if not 1 < len(basket) <= max_basket:
+            continue
+        for product_id in basket:
+            others = counts[product_id]
+            for other_id in basket:
+                if other_id != product_id:
+                    others[other_id] += 1
+            if len(others) >= 2 * candidates:
+                counts[product_id] = trim(others, candidates)
+    return {product_id: trim(others, candidates) for product_id, others in counts.items()}, orders
+
+
+def _count_range(args):
+    return count_pairs(*args)
+
+
+def _init_worker():
+    # Spawned workers start without Django; forked ones already have it
+    if not apps.ready:
+        django.setup()
+
+
+def merge(parts):
+    counts = defaultdict(Counter)
+    orders = 0
+    for part, part_orders in parts:
+        orders += part_orders
+        for product_id, others in part.items():
+            counts[product_id].update(others)
+    candidates = settings.PRODUCTS_RECOMMENDATION_CANDIDATES
+    return {product_id: trim(others, candidates) for product_id, others in counts.items()}, orders
+
+
+def save(counts, full):
+    """
+    Store each product's top PRODUCTS_RECOMMENDATION_LIMIT pairings. An
+    incremental run adds its counts to the stored scores of the products it
+    saw and leaves every other product's recommendations alone.
+    """
+    limit = settings.PRODUCTS_RECOMMENDATION_LIMIT
+    product_ids = sorted(counts)
+    with transaction.atomic():
+        if full:
+            ProductRecommendation.objects.all().delete()
+        for start in range(0, len(product_ids), WRITE_BATCH):
+            batch = product_ids[start:start + WRITE_BATCH]
+            if not full:
+                stored = ProductRecommendation.objects.filter(product_id__in=batch)
+                for product_id, recommended_id, score in stored.values_list('product_id', 'recommended_id', 'score'):
+                    counts[product_id][recommended_id] += score
+                stored.delete()
+            ProductRecommendation.objects.bulk_create([
+                ProductRecommendation(product_id=product_id, recommended_id=recommended_id, score=score)
+                for product_id in batch
+                for recommended_id, score in trim(counts[product_id], limit).items()
+            ])
+
+
+def build(full=False, workers=1, chunk_size=10000):
+    """
+    Bring the recommendations up to date with the orders placed since the
+    last run, or with every order when ``full`` is set. With more than one
+    worker, ranges of ``chunk_size`` order ids are counted in separate
+    processes. Returns the RecommendationRun, or None if there was nothing new.
+
+    Order ids are handed out before their transaction commits, so an order
+    can appear below ids an earlier run already read. Each run therefore
+    reads the last PRODUCTS_RECOMMENDATION_OVERLAP ids before the previous
+    watermark again and skips the orders that run recorded as counted. An
+    order that commits more than that many ids late is still missed until
+    the next full run.
+    """
+    overlap = settings.PRODUCTS_RECOMMENDATION_OVERLAP
+    previous = RecommendationRun.objects.order_by('-pk').first()
+    full = full or previous is None
+    after = 0 if full else max(previous.last_order_id - overlap, 0)
+    counted = set() if full else set(previous.counted_order_ids)
+    # Orders placed while this runs are left for the next run
+    last = Order.objects.aggregate(last=Max('pk'))['last'] or 0
+    floor = max(last - overlap, after)
+    committed = set(Order.objects.filter(pk__gt=floor, pk__lte=last).values_list('pk', flat=True))
+    if not full and last <= previous.last_order_id and committed <= counted:
+        return None
+    # Ids in the window with no order yet may still commit; counting one that
+    # lands mid-run would have the next run count it again
+    skip = frozenset(counted | (set(range(floor + 1, last + 1)) - committed))
+    ranges = [(start, min(start + chunk_size, last), skip) for start in range(after, last, chunk_size)]
+    if workers > 1 and len(ranges) > 1:
+        # Forked workers must not share the parent's database connection
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            counts, orders = merge(pool.map(_count_range, ranges))
+    else:
+        counts, orders = merge(map(_count_range, ranges))
+    save(counts, full)
+    return RecommendationRun.objects.create(
+        last_order_id=last, counted_order_ids=sorted(committed), orders=orders, full=full,
+    )
+
+
+def recommended_products(product):
+    """The products most often bought with ``product``, in one indexed query."""
+    recommendations = (
+        ProductRecommendation.objects.filter(product=product)
+        .select_related('recommended')
+        .order_by('-score', 'recommended_id')[:settings.PRODUCTS_RECOMMENDATION_LIMIT]
+    )
+    return [recommendation.recommended for recommendation in recommendations]
@@ -0,0 +1,267 @@
+import difflib
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Product
+
+TERM_RE = re.compile(r'\w+')
+# Control characters never occur in product text, so they can delimit matches
+# until the text has been HTML-escaped
+MARK_START, MARK_END = '\x02', '\x03'
+
+
+def parse_terms(query):
+    return TERM_RE.findall(query.lower())
+
+
+def highlight(text):
+    if not text:
+        return ''
+    return mark_safe(escape(text).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>'))
+
+
+class SearchHit:
+    def __init__(self, pk, name, snippet):
+        self.pk = pk
+        self.name = name
+        self.snippet = snippet
+
+
+class SQLiteSearchBackend:
+    """FTS5 virtual table whose rowid is the product id, ranked with bm25."""
+
+    table = 'products_product_fts'
+    vocab_table = 'products_product_fts_vocab'
+    # bm25 column weights: name, description
+    weights = (10.0, 1.0)
+
+    def index_products(self, pks):
+        pks = list(pks)
+        if not pks:
+            return
+        placeholders = ', '.join(['%s'] * len(pks))
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid IN ({placeholders})', pks)
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, name, description) '
+                f'SELECT id, name, description FROM products_product WHERE id IN ({placeholders})',
+                pks,
+            )
+
+    def remove_products(self, pks):
+        pks = list(pks)
+        if not pks:
+            return
+        placeholders = ', '.join(['%s'] * len(pks))
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid IN ({placeholders})', pks)
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, name, description) '
+                'SELECT id, name, description FROM products_product'
+            )
+            cursor.execute(f"INSERT INTO {self.table} ({self.table}) VALUES ('optimize')")
+
+    def search(self, terms, offset, limit):
+        match = ' '.join(f'"{term}"*' for term in terms)
+        weights = ', '.join(str(w) for w in self.weights)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid, highlight({self.table}, 0, %s, %s), '
+                f"snippet({self.table}, 1, %s, %s, '…', 16) "
+                f'FROM {self.table} WHERE {self.table} MATCH %s '
+                f'ORDER BY bm25({self.table}, {weights}), rowid LIMIT %s OFFSET %s',
+                [MARK_START, MARK_END, MARK_START, MARK_END, match, limit, offset],
+            )
+            return [SearchHit(*row) for row in cursor.fetchall()]
+
+    def correct(self, term):
+        # Only terms sharing the first letter and of similar length are compared,
+        # which keeps the candidate list small even with a large vocabulary
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT term FROM {self.vocab_table} WHERE term >= %s AND term < %s '
+                'AND length(term) BETWEEN %s AND %s',
+                [term[0], chr(ord(term[0]) + 1), len(term) - 2, len(term) + 2],
+            )
+            candidates = [row[0] for row in cursor.fetchall()]
+        matches = difflib.get_close_matches(term, candidates, n=1, cutoff=0.75)
+        return matches[0] if matches else None
+
+
+class PostgresSearchBackend:
+    """
+    Weighted tsvector per product in a side table with a GIN index. Spelling
+    corrections come from a pg_trgm-indexed table of every indexed word.
+    """
+
+    table = 'products_product_search'
+    words_table = 'products_product_words'
+    document_sql = (
+        "setweight(to_tsvector('simple', p.name), 'A') || "
+        "setweight(to_tsvector('simple', p.description), 'B')"
+    )
+
+    def _upsert(self, pks=None):
+        if pks is None:
+            where = words_where = ''
+            params = []
+        else:
+            where, words_where = 'WHERE p.id = ANY(%s)', 'WHERE s.product_id = ANY(%s)'
+            params = [pks]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {self.table} (product_id, document) '
+                f'SELECT p.id, {self.document_sql} FROM products_product p {where} '
+                'ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document',
+                params,
+            )
+            cursor.execute(
+                f'INSERT INTO {self.words_table} (word) '
+                f'SELECT DISTINCT (unnest(document)).lexeme FROM {self.table} s {words_where} '
+                'ON CONFLICT (word) DO NOTHING',
+                params,
+            )
+
+    def index_products(self, pks):
+        pks = list(pks)
+        if pks:
+            self._upsert(pks)
+
+    def remove_products(self, pks):
+        pks = list(pks)
+        if not pks:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE product_id = ANY(%s)', [pks])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'TRUNCATE {self.table}, {self.words_table}')
+        self._upsert()
+
+    def search(self, terms, offset, limit):
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        options = f'StartSel={MARK_START}, StopSel={MARK_END}'
+        with connection.cursor() as cursor:
+            # Headlines are expensive, so they are only built for the rows on this page
+            cursor.execute(
+                'SELECT p.id, '
+                "ts_headline('simple', p.name, hits.query, %s), "
+                "ts_headline('simple', p.description, hits.query, %s) "
+                "FROM (SELECT product_id, query, ts_rank(document, query) AS rank "
+                f"FROM {self.table}, to_tsquery('simple', %s) query WHERE document @@ query "
+                'ORDER BY rank DESC, product_id LIMIT %s OFFSET %s) hits '
+                'JOIN products_product p ON p.id = hits.product_id '
+                'ORDER BY hits.rank DESC, p.id',
+                [f'HighlightAll=true, {options}', f'MaxWords=20, MinWords=8, {options}', tsquery, limit, offset],
+            )
+            return [SearchHit(*row) for row in cursor.fetchall()]
+
+    def correct(self, term):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT word FROM {self.words_table} WHERE word %% %s '
+                'ORDER BY similarity(word, %s) DESC, word LIMIT 1',
+                [term, term],
+            )
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+
+class FallbackSearchBackend:
+    """Unindexed ORM search for databases without a full-text backend."""
+
+    def index_products(self, pks):
+        pass
+
+    def remove_products(self, pks):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def search(self, terms, offset, limit):
+        condition = Q()
+        for term in terms:
+            condition &= Q(name__icontains=term) | Q(description__icontains=term)
+        rows = (
+            Product.objects.filter(condition).order_by('name', 'pk')
+            .values_list('pk', 'name')[offset:offset + limit]
+        )
+        return [SearchHit(pk, name, '') for pk, name in rows]
+
+    def correct(self, term):
+        return None
+
+
+def get_backend():
+    if connection.vendor == 'sqlite':
+        return SQLiteSearchBackend()
+    if connection.vendor == 'postgresql':
+        return PostgresSearchBackend()
+    return FallbackSearchBackend()
+
+
+class SearchResults:
+    def __init__(self, object_list, number, has_next, corrected_query=None):
+        self.object_list = object_list
+        self.number = number
+        self._has_next = has_next
+        self.corrected_query = corrected_query
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self.number > 1
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return self.number - 1
+
+
+def search_products(query, page=1, per_page=20):
+    terms = parse_terms(query)
+    if not terms:
+        return SearchResults([], page, False)
+    backend = get_backend()
+    offset = (page - 1) * per_page
+    hits = backend.search(terms, offset, per_page + 1)
+    corrected_query = None
+    if not hits:
+        corrected = [backend.correct(term) or term for term in terms]
+        if corrected != terms:
+            hits = backend.search(corrected, offset, per_page + 1)
+            corrected_query = ' '.join(corrected)
+
+    has_next = len(hits) > per_page
+    hits = hits[:per_page]
+    products = Product.objects.only('name', 'price').in_bulk([hit.pk for hit in hits])
+    results = []
+    # in_bulk loses the relevance order, and a row deleted mid-request is simply skipped
+    for hit in hits:
+        product = products.get(hit.pk)
+        if product is not None:
+            product.name_highlight = highlight(hit.name)
+            product.snippet = highlight(hit.snippet)
+            results.append(product)
+    return SearchResults(results, page, has_next, corrected_query)
@@ -0,0 +1,37 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import autocomplete, catalog
+from .models import Product
+from .search import get_backend
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, **kwargs):
+    if not raw:
+        get_backend().index_products([instance.pk])
+        # The in-memory index cannot be rolled back, so it only sees committed saves
+        pk, name = instance.pk, instance.name
+        transaction.on_commit(lambda: autocomplete.index.update(pk, name))
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    get_backend().remove_products([instance.pk])
+    pk = instance.pk
+    transaction.on_commit(lambda: autocomplete.index.remove(pk))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product(sender, instance, raw=False, **kwargs):
+    # After commit, so a reader can't cache the old row under the new version.
+    # The catalog goes first: cached_fragments relies on a reader that sees the
+    # new product version also seeing the new catalog version
+    def invalidate():
+        catalog.bump()
+        catalog.bump_product(pk)
+    pk = instance.pk
+    if not raw:
+        transaction.on_commit(invalidate)
@@ -0,0 +1,131 @@
+import uuid
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Product, StockReservation
+
+
+def _take(product_id, quantity):
+    """Take units out of stock with one conditional UPDATE. Returns False if there are not enough."""
+    taken = Product.objects.filter(pk=product_id, stock__gte=quantity).update(stock=F('stock') - quantity)
+    # Products without tracked stock never sell out
+    return bool(taken) or not Product.objects.filter(pk=product_id, stock__isnull=False).exists()
+
+
+def adjust(product_id, change):
+    """
+    Add ``change`` units to a product's stock, or take them away when it is
+    negative, with one conditional UPDATE relative to the current count so
+    units reserved meanwhile are never put back on sale. Returns False, and
+    changes nothing, if there are fewer than -change units. A product
+    without tracked stock starts counting from zero.
+    """
+    products = Product.objects.filter(pk=product_id)
+    if change < 0:
+        products = products.filter(stock__gte=-change)
+    return bool(products.update(stock=Coalesce('stock', 0) + change))
+
+
+def _quantities(lines):
+    quantities = Counter()
+    for line in lines:
+        quantities[line.product_id] += line.quantity
+    return quantities
+
+
+def reserve(user, lines):
+    """
+    Take the cart's units out of stock and hold them for this user.
+
+    Each product costs one conditional UPDATE, so concurrent buyers never wait
+    on a row lock to read the stock first. Returns (token, sold_out): the
+    token names the reservation, and is None when any product in sold_out is
+    short, in which case nothing is taken.
+
+    Holds from the user's earlier checkouts are given back first, so starting
+    checkout again never pins more than one cart's worth. If one of those
+    sessions is paid after all, convert() takes its units again.
+    """
+    quantities = _quantities(lines)
+    with transaction.atomic():
+        release(user=user)
+        sold_out = [
+            product_id for product_id, quantity in sorted(quantities.items()) if not _take(product_id, quantity)
+        ]
+        if sold_out:
+            transaction.set_rollback(True)
+            return None, sold_out
+        token = uuid.uuid4()
+        expires_at = timezone.now() + timedelta(seconds=settings.STOCK_RESERVATION_SECONDS)
+        StockReservation.objects.bulk_create([
+            StockReservation(token=token, user=user, product_id=product_id, quantity=quantity, expires_at=expires_at)
+            for product_id, quantity in quantities.items()
+        ])
+    return token, []
+
+
+def attach_session(token, session_id):
+    StockReservation.objects.filter(token=token).update(stripe_session_id=session_id)
+
+
+def _restock(reservations):
+    """Put the units of these (product_id, quantity) rows back on sale, one UPDATE per product."""
+    quantities = Counter()
+    for product_id, quantity in reservations:
+        quantities[product_id] += quantity
+    for product_id, quantity in sorted(quantities.items()):
+        Product.objects.filter(pk=product_id, stock__isnull=False).update(stock=F('stock') + quantity)
+
+
+def release(**filters):
+    """Cancel reservations matching ``filters`` and restock their units. Returns how many were released."""
+    with transaction.atomic():
+        reservations = StockReservation.objects.filter(**filters)
+        if connection.features.has_select_for_update_skip_locked:
+            reservations = reservations.select_for_update(skip_locked=True)
+        rows = list(reservations.values_list('pk', 'product_id', 'quantity'))
+        if not rows:
+            return 0
+        StockReservation.objects.filter(pk__in=[pk for pk, product_id, quantity in rows]).delete()
+        _restock((product_id, quantity) for pk, product_id, quantity in rows)
+    return len(rows)
+
+
+def convert(session_id, lines):
+    """
+    The session's order is being placed: its held units stay sold and the
+    hold goes away. Units whose hold already lapsed and went back on sale are
+    taken again. Returns False if some of them had sold out in the meantime.
+    """
+    held = StockReservation.objects.filter(stripe_session_id=session_id)
+    if connection.features.has_select_for_update:
+        # Keeps the sweeper, which skips locked rows, from restocking them under us
+        held = held.select_for_update()
+    missing = _quantities(lines)
+    for product_id, quantity in held.values_list('product_id', 'quantity'):
+        missing[product_id] -= quantity
+    StockReservation.objects.filter(stripe_session_id=session_id).delete()
+    in_stock = True
+    for product_id, quantity in sorted(missing.items()):
+        if quantity > 0 and not _take(product_id, quantity):
+            in_stock = False
+    return in_stock
+
+
+def release_expired(batch_size=500):
+    """Release one batch of expired reservations. Returns how many were released."""
+    now = timezone.now()
+    pks = list(
+        StockReservation.objects.filter(expires_at__lte=now)
+        .order_by('expires_at')
+        .values_list('pk', flat=True)[:batch_size]
+    )
+    if not pks:
+        return 0
+    return release(pk__in=pks, expires_at__lte=now)
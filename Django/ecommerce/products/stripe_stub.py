@@ -0,0 +1,167 @@
+"""
+A local stand-in for the parts of the Stripe API the shop calls, so tests and
+benchmarks run offline with a controllable response time.
+
+Run it with ``manage.py stripe_stub`` and point STRIPE_API_BASE at it, or
+start a ``StripeStub`` in-process from a test.
+"""
+import hashlib
+import hmac
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+
+def signature_header(payload, secret, timestamp=None):
+    """The Stripe-Signature header Stripe would send with a webhook payload."""
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    signature = hmac.new(secret.encode(), f'{timestamp}.{payload}'.encode(), hashlib.sha256).hexdigest()
+    return f't={timestamp},v1={signature}'
+
+
+class StripeStubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.dispatch('GET')
+
+    def do_POST(self):
+        self.dispatch('POST')
+
+    def dispatch(self, method):
+        length = int(self.headers.get('Content-Length') or 0)
+        params = dict(parse_qsl(self.rfile.read(length).decode())) if length else {}
+        stub = self.server.stub
+        stub.record(method, self.path, params)
+        stub.wait()
+        path = self.path.split('?', 1)[0].rstrip('/')
+        if method == 'POST' and path == '/v1/checkout/sessions':
+            self.respond(200, stub.create_session(params))
+        elif method == 'GET' and path.startswith('/v1/checkout/sessions/'):
+            session = stub.get_session(path.rsplit('/', 1)[1])
+            if session is None:
+                self.respond(404, {'error': {'type': 'invalid_request_error', 'message': 'No such checkout.session'}})
+            else:
+                self.respond(200, session)
+        elif method == 'POST' and path == '/v1/customers':
+            self.respond(200, stub.create_customer(params))
+        else:
+            self.respond(404, {'error': {'type': 'invalid_request_error', 'message': f'Unrecognized request URL ({method}: {path})'}})
+
+    def respond(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.send_header('Request-Id', f'req_{uuid.uuid4().hex[:14]}')
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class StripeStubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients that time out hang up before the delayed response is written
+        pass
+
+
+class StripeStub:
+    """
+    Serves checkout sessions and customers from memory. Every response is
+    held back by ``latency`` seconds plus up to ``jitter`` more, and retrieved
+    sessions report ``payment_status``.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, jitter=0.0, payment_status='paid'):
+        self.latency = latency
+        self.jitter = jitter
+        self.payment_status = payment_status
+        self.sessions = {}
+        self.requests = []
+        self._lock = threading.Lock()
+        self._server = StripeStubServer((host, port), StripeStubHandler)
+        self._server.stub = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def record(self, method, path, params):
+        with self._lock:
+            self.requests.append((method, path, params))
+
+    def wait(self):
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            time.sleep(delay)
+
+    def create_session(self, params):
+        session_id = f'cs_test_{uuid.uuid4().hex}'
+        session = {
+            'id': session_id,
+            'object': 'checkout.session',
+            'url': f'https://checkout.stripe.com/c/pay/{session_id}',
+            'mode': params.get('mode', 'payment'),
+            'success_url': params.get('success_url'),
+            'cancel_url': params.get('cancel_url'),
+            'client_reference_id': params.get('client_reference_id'),
+            'expires_at': int(params['expires_at']) if params.get('expires_at') else None,
+            'payment_status': 'unpaid',
+            'status': 'open',
+            'livemode': False,
+        }
+        with self._lock:
+            self.sessions[session_id] = session
+        return session
+
+    def get_session(self, session_id):
+        with self._lock:
+            session = self.sessions.get(session_id)
+        if session is None:
+            return None
+        return {**session, 'payment_status': self.payment_status}
+
+    def event(self, session_id, event_type='checkout.session.completed'):
+        """The webhook event Stripe would send for a session, as a JSON payload."""
+        return json.dumps({
+            'id': f'evt_{uuid.uuid4().hex[:14]}',
+            'object': 'event',
+            'type': event_type,
+            'created': int(time.time()),
+            'livemode': False,
+            'data': {'object': self.get_session(session_id)},
+        })
+
+    def create_customer(self, params):
+        return {
+            'id': f'cus_{uuid.uuid4().hex[:14]}',
+            'object': 'customer',
+            'email': params.get('email'),
+            'name': params.get('name'),
+            'created': int(time.time()),
+            'livemode': False,
+        }
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread:
+            self._thread.join()
@@ -1,7 +1,30 @@
-from django.test import TestCase, Client
+import gc
+import gzip
+import importlib
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+import stripe
+from asgiref.sync import async_to_sync
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections
+from django.test import TestCase, TransactionTestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from djstripe.models import Customer as DjstripeCustomer
 from django.contrib.auth import get_user_model
-from .models import Product, Cart, CartItem, Order, OrderItem
+from . import api, autocomplete, catalog, fulfillment, payments, recommendations, stock
+from .cart import add_item
+from .checkout import materialize_order, record_session
+from .payments import create_customer
+from .stripe_stub import StripeStub, signature_header
+from .models import Product, Cart, CartItem, CheckoutLine, Order, OrderItem, FulfillmentJob, ProductRecommendation, StockReservation
 
 User = get_user_model()
 
@@ -61,8 +84,30 @@ class OrderModelTest(TestCase):
         self.assertEqual(order_item.product, self.product)
         self.assertEqual(order_item.quantity, 1)
 
-class ViewTest(TestCase):
+class StripeStubMixin:
+    """Serve the Stripe API from a local stub for the duration of the test class."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.stripe = StripeStub().start()
+        cls.addClassCleanup(cls.stripe.stop)
+        settings_override = override_settings(STRIPE_API_BASE=cls.stripe.url)
+        settings_override.enable()
+        cls.addClassCleanup(settings_override.disable)
+        api_base = mock.patch.object(stripe, 'api_base', cls.stripe.url)
+        api_base.start()
+        cls.addClassCleanup(api_base.stop)
+
     def setUp(self):
+        super().setUp()
+        self.stripe.latency = 0.0
+        self.stripe.payment_status = 'paid'
+        self.stripe.requests.clear()
+
+class ViewTest(StripeStubMixin, TestCase):
+    def setUp(self):
+        super().setUp()
         self.client = Client()
         self.user = User.objects.create_user(username='testuser', password='testpassword')
         self.product = Product.objects.create(name='Test Product', description='A test description', price=10.00)
@@ -75,9 +120,19 @@ class ViewTest(TestCase):
         self.assertEqual(cart.items.count(), 1)
         self.assertEqual(cart.items.first().product, self.product)
 
-    # Note: Testing the full Stripe checkout flow is complex and usually involves mock objects
-    # or a dedicated testing environment for Stripe. This test will only cover the initial
-    # redirection to Stripe.
+    def test_add_to_cart_increments_in_place(self):
+        self.client.login(username='testuser', password='testpassword')
+        self.client.get(reverse('add_to_cart', args=[self.product.pk]))
+        # Session and user, the cart, then one upsert
+        with self.assertNumQueries(4):
+            self.client.get(reverse('add_to_cart', args=[self.product.pk]))
+        item = CartItem.objects.get(cart__user=self.user)
+        self.assertEqual(item.quantity, 2)
+        self.assertEqual(self.client.get(reverse('add_to_cart', args=[self.product.pk + 100])).status_code, 404)
+        self.assertEqual(CartItem.objects.count(), 1)
+
+    # Note: Stripe is served by the local stub, so this covers the redirection to
+    # Stripe without network access.
     def test_checkout_view_redirects_to_stripe(self):
         self.client.login(username='testuser', password='testpassword')
         cart = Cart.objects.create(user=self.user)
@@ -85,4 +140,897 @@ class ViewTest(TestCase):
         
         response = self.client.post(reverse('checkout'))
         self.assertEqual(response.status_code, 303) # Redirects to Stripe
-        self.assertIn('https://checkout.stripe.com', response.url)
\ No newline at end of file
+        self.assertIn('https://checkout.stripe.com', response.url)
+        method, path, params = self.stripe.requests[-1]
+        self.assertEqual(path, '/v1/checkout/sessions')
+        self.assertEqual(params['line_items[0][price_data][unit_amount]'], '1000')
+
+    def test_checkout_page_reads_the_stored_stripe_customer(self):
+        self.user.stripe_customer_id = 'cus_test'
+        self.user.save()
+        self.client.login(username='testuser', password='testpassword')
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.product, quantity=1)
+        # Session and user, the cart and its lines
+        with self.assertNumQueries(4):
+            self.assertEqual(self.client.get(reverse('checkout')).status_code, 200)
+        self.assertEqual(self.stripe.requests, [])
+        self.client.post(reverse('checkout'))
+        method, path, params = self.stripe.requests[-1]
+        self.assertEqual(params['customer'], 'cus_test')
+
+    def test_first_checkout_creates_the_stripe_customer(self):
+        self.client.login(username='testuser', password='testpassword')
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.product, quantity=1)
+        self.client.get(reverse('checkout'))
+        self.assertEqual(self.stripe.requests, [])
+        self.assertEqual(self.client.post(reverse('checkout')).status_code, 303)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.stripe_customer_id.startswith('cus_'))
+        self.assertEqual([path for method, path, params in self.stripe.requests], ['/v1/customers', '/v1/checkout/sessions'])
+        self.assertEqual(self.stripe.requests[-1][2]['customer'], self.user.stripe_customer_id)
+        self.client.post(reverse('checkout'))
+        self.assertEqual([path for method, path, params in self.stripe.requests].count('/v1/customers'), 1)
+
+    def test_stripe_clients_close_with_per_call_loops(self):
+        async def create():
+            async with payments.stripe_client() as client, payments.stripe_client() as nested:
+                self.assertIs(nested, client)
+                return await payments.create_stripe_customer(self.user)
+
+        for _ in range(5):
+            async_to_sync(create)()
+        gc.collect()
+        # Each call ran on a loop of its own; none of them is kept alive by a cached client
+        self.assertEqual(len(payments._clients), 0)
+        self.assertEqual(len(self.stripe.requests), 5)
+
+    def test_stripe_customer_is_created_once(self):
+        customer_id = async_to_sync(create_customer)(self.user)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.stripe_customer_id, customer_id)
+        method, path, params = self.stripe.requests[-1]
+        self.assertEqual((path, params['metadata[user_id]']), ('/v1/customers', str(self.user.pk)))
+        # A second creation, say from a racing request, does not replace the stored id
+        async_to_sync(create_customer)(self.user)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.stripe_customer_id, customer_id)
+
+    def test_checkout_adopts_a_known_stripe_customer(self):
+        DjstripeCustomer.objects.create(id='cus_known', subscriber=self.user, livemode=False)
+        self.client.login(username='testuser', password='testpassword')
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.product, quantity=1)
+        self.assertEqual(self.client.post(reverse('checkout')).status_code, 303)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.stripe_customer_id, 'cus_known')
+        self.assertEqual([path for method, path, params in self.stripe.requests], ['/v1/checkout/sessions'])
+        self.assertEqual(self.stripe.requests[-1][2]['customer'], 'cus_known')
+
+    def test_sync_stripe_customers_command(self):
+        linked = User.objects.create_user(username='linked')
+        DjstripeCustomer.objects.create(id='cus_known', subscriber=linked, livemode=False)
+        User.objects.create_user(username='done', stripe_customer_id='cus_done')
+        out = StringIO()
+        call_command('sync_stripe_customers', stdout=out)
+        self.assertIn('Linked 1 existing customers, created 1, 0 failed.', out.getvalue())
+        self.assertEqual(
+            dict(User.objects.values_list('username', 'stripe_customer_id')),
+            {'testuser': User.objects.get(username='testuser').stripe_customer_id, 'linked': 'cus_known', 'done': 'cus_done'},
+        )
+        self.assertTrue(User.objects.get(username='testuser').stripe_customer_id.startswith('cus_'))
+
+    @override_settings(STRIPE_TIMEOUT=0.2, STRIPE_MAX_NETWORK_RETRIES=0)
+    def test_checkout_gives_up_on_a_slow_stripe(self):
+        self.client.login(username='testuser', password='testpassword')
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.product, quantity=1)
+        self.user.stripe_customer_id = 'cus_test'
+        self.user.save()
+        self.stripe.latency = 1.0
+        started = time.perf_counter()
+        with self.assertLogs('products.views', 'ERROR') as logs:
+            response = self.client.post(reverse('checkout'))
+        self.assertLess(time.perf_counter() - started, 1.0)
+        self.assertRedirects(response, reverse('stripe_cancel'))
+        self.assertIn('Could not create a Stripe checkout session', logs.output[0])
+
+class OrderHistoryViewTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.client.login(username='testuser', password='testpassword')
+        self.products = [Product.objects.create(name=f'Product {i}', description='A test description', price=10.00) for i in range(5)]
+
+    def place_orders(self, count):
+        orders = Order.objects.bulk_create([Order(user=self.user, total_price=50.00, shipping_address='123 Test St') for _ in range(count)])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, quantity=1, price=product.price)
+            for order in orders for product in self.products
+        ])
+
+    def test_order_history_query_count_is_constant(self):
+        self.place_orders(1)
+        with self.assertNumQueries(5):
+            self.client.get(reverse('order_history'))
+        self.place_orders(30)
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('order_history'))
+        self.assertEqual(len(response.context['page_obj']), 10)
+        self.assertContains(response, 'Product 4')
+
+class ProductListViewTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        Product.objects.bulk_create([
+            Product(name=f'Product {i}', description='word ' * 100, price=10.00) for i in range(45)
+        ])
+
+    def test_list_is_paginated_with_configurable_page_size(self):
+        response = self.client.get(reverse('product_list'))
+        self.assertEqual(len(response.context['products']), 20)
+        self.assertEqual(response.context['paginator'].num_pages, 3)
+        response = self.client.get(reverse('product_list'), {'page_size': 1000, 'page': 1})
+        self.assertEqual(len(response.context['products']), 45)
+
+    def test_description_is_deferred_and_excerpted(self):
+        response = self.client.get(reverse('product_list'))
+        product = response.context['products'][0]
+        self.assertIn('description', product.get_deferred_fields())
+        self.assertContains(response, 'word word')
+        self.assertContains(response, '…')
+        self.assertNotContains(response, 'word ' * 50)
+
+    @override_settings(PRODUCTS_COUNT_STRATEGY='none')
+    def test_has_next_only_mode_never_counts(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('product_list'), {'page': 3})
+        self.assertFalse(any('COUNT(' in query['sql'] for query in queries))
+        self.assertEqual(len(response.context['products']), 5)
+        self.assertFalse(response.context['page_obj'].has_next())
+        self.assertContains(response, 'Previous')
+        self.assertTrue(self.client.get(reverse('product_list')).context['page_obj'].has_next())
+        self.assertEqual(self.client.get(reverse('product_list'), {'page': 4}).status_code, 404)
+
+    @override_settings(PRODUCTS_COUNT_STRATEGY='estimate')
+    def test_estimated_count_skips_count_for_the_whole_catalog(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('product_list'))
+        self.assertFalse(any('COUNT(' in query['sql'] for query in queries))
+        self.assertEqual(response.context['paginator'].count, 45)
+
+    @override_settings(PRODUCTS_COUNT_STRATEGY='estimate')
+    def test_estimate_never_links_past_the_last_row(self):
+        # Max(pk) still says 45 after the deletes
+        Product.objects.filter(pk__in=list(Product.objects.order_by('pk').values_list('pk', flat=True)[:30])).delete()
+        response = self.client.get(reverse('product_list'), {'page': 1, 'page_size': 10})
+        self.assertTrue(response.context['page_obj'].has_next())
+        response = self.client.get(reverse('product_list'), {'page': 2, 'page_size': 10})
+        self.assertEqual(len(response.context['products']), 5)
+        self.assertFalse(response.context['page_obj'].has_next())
+        self.assertEqual(response.context['paginator'].num_pages, 2)
+        self.assertNotContains(response, 'Next')
+        self.assertEqual(self.client.get(reverse('product_list'), {'page': 3, 'page_size': 10}).status_code, 404)
+
+
+class ProductSearchTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.lamp = Product.objects.create(name='Brass desk lamp', description='A warm reading light for the study.', price=40.00)
+        self.shade = Product.objects.create(name='Linen shade', description='Fits any desk lamp with a <b>brass</b> fitting.', price=15.00)
+        Product.objects.create(name='Oak bookshelf', description='Solid oak shelving.', price=120.00)
+
+    def search(self, query, **params):
+        return self.client.get(reverse('product_list'), {'query': query, **params})
+
+    def test_results_are_ranked_by_relevance(self):
+        response = self.search('lamp')
+        # A name match outranks a description match
+        self.assertEqual(list(response.context['products']), [self.lamp, self.shade])
+
+    def test_snippets_are_highlighted_and_escaped(self):
+        response = self.search('brass')
+        self.assertContains(response, '<mark>Brass</mark> desk lamp')
+        self.assertContains(response, '&lt;b&gt;<mark>brass</mark>&lt;/b&gt;')
+
+    def test_typos_are_corrected(self):
+        response = self.search('bookshelv')
+        self.assertEqual([p.name for p in response.context['products']], ['Oak bookshelf'])
+        response = self.search('bokshelf')
+        self.assertEqual(response.context['page_obj'].corrected_query, 'bookshelf')
+        self.assertContains(response, 'Showing results for')
+
+    def test_index_follows_create_update_and_delete(self):
+        self.client.login(username='testuser', password='testpassword')
+        self.client.post(reverse('product_create'), {'name': 'Walnut stool', 'description': 'Three legs.', 'price': '30.00'})
+        self.assertEqual([p.name for p in self.search('walnut').context['products']], ['Walnut stool'])
+        self.client.post(reverse('product_update', args=[self.lamp.pk]), {'name': 'Copper desk lamp', 'description': 'Warm light.', 'price': '40.00'})
+        self.assertEqual(list(self.search('copper').context['products']), [self.lamp])
+        self.assertNotIn(self.lamp, self.search('reading').context['products'])
+        self.shade.delete()
+        self.assertEqual(list(self.search('fitting').context['products']), [])
+
+    def test_rebuild_command(self):
+        Product.objects.bulk_create([Product(name='Velvet cushion', description='Soft.', price=9.00)])
+        self.assertEqual(list(self.search('velvet').context['products']), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual([p.name for p in self.search('velvet').context['products']], ['Velvet cushion'])
+
+    def test_search_pages(self):
+        Product.objects.bulk_create([Product(name=f'Chair {i}', description='Seat.', price=9.00) for i in range(25)])
+        call_command('rebuild_search_index', stdout=StringIO())
+        response = self.search('chair')
+        self.assertEqual(len(response.context['products']), 20)
+        self.assertTrue(response.context['page_obj'].has_next())
+        response = self.search('chair', page=2)
+        self.assertEqual(len(response.context['products']), 5)
+        self.assertFalse(response.context['page_obj'].has_next())
+
+
+class ProductAutocompleteTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.lamp = Product.objects.create(name='Brass desk lamp', description='Warm light.', price=40.00)
+        self.desk = Product.objects.create(name='Oak desk', description='Solid oak.', price=200.00)
+        Product.objects.create(name='Linen shade', description='Fits any lamp.', price=15.00)
+        autocomplete.index.build()
+
+    def complete(self, prefix, **params):
+        return self.client.get(reverse('product_autocomplete'), {'q': prefix, **params}).json()['results']
+
+    def test_matches_the_start_of_any_word_without_queries(self):
+        with self.assertNumQueries(0):
+            results = self.complete('DESK')
+        # Matches come back in key order, so a name ending at the prefix comes first
+        self.assertEqual(results, [
+            {'pk': self.desk.pk, 'name': 'Oak desk'},
+            {'pk': self.lamp.pk, 'name': 'Brass desk lamp'},
+        ])
+        self.assertEqual([r['name'] for r in self.complete('desk  la')], ['Brass desk lamp'])
+        self.assertEqual(self.complete('esk'), [])
+        self.assertEqual(self.complete(''), [])
+
+    def test_first_lookups_share_one_build(self):
+        index = autocomplete.PrefixIndex()
+        build = index.build
+
+        def slow_build():
+            time.sleep(0.05)
+            build([(1, 'Oak desk')])
+
+        with mock.patch.object(index, 'build', side_effect=slow_build) as calls:
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                results = list(pool.map(index.complete, ['oak'] * 4))
+        self.assertEqual(calls.call_count, 1)
+        self.assertEqual(results, [[(1, 'Oak desk')]] * 4)
+
+    def test_loading_the_entry_points_reads_nothing(self):
+        with self.assertNumQueries(0):
+            importlib.reload(importlib.import_module('main_project.wsgi'))
+            importlib.reload(importlib.import_module('main_project.asgi'))
+
+    def test_limit_is_capped(self):
+        Product.objects.bulk_create([Product(name=f'Chair {i}', description='', price=9.00) for i in range(20)])
+        autocomplete.index.build()
+        self.assertEqual(len(self.complete('chair', limit=3)), 3)
+        self.assertEqual(len(self.complete('chair', limit=1000)), 10)
+
+    def test_index_follows_saves_and_deletes(self):
+        self.client.login(username='testuser', password='testpassword')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('product_update', args=[self.lamp.pk]), {'name': 'Copper desk lamp', 'description': 'Warm.', 'price': '40.00'})
+        self.assertEqual([r['name'] for r in self.complete('copp')], ['Copper desk lamp'])
+        self.assertEqual(self.complete('brass'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.desk.delete()
+        self.assertEqual([r['name'] for r in self.complete('desk')], ['Copper desk lamp'])
+
+
+class ProductApiTest(TestCase):
+    def setUp(self):
+        catalog.get_cache().clear()
+        self.products = [
+            Product.objects.create(name=f'Item {i}', description=f'Description {i}', price='2.50') for i in range(5)
+        ]
+        self.url = reverse('api_product_list')
+
+    def test_pages_through_the_catalog_with_a_cursor(self):
+        response = self.client.get(self.url, {'limit': 2, 'fields': 'id,price'})
+        self.assertEqual(response.json()['results'], [
+            {'id': self.products[0].pk, 'price': '2.50'}, {'id': self.products[1].pk, 'price': '2.50'},
+        ])
+        seen = []
+        url = response.json()['next']
+        while url:
+            page = self.client.get(url).json()
+            seen += [row['id'] for row in page['results']]
+            self.assertEqual(set(page['results'][0]), {'id', 'price'})
+            url = page['next']
+        self.assertEqual(seen, [product.pk for product in self.products[2:]])
+
+    @override_settings(PRODUCTS_FEED_OVERLAP=60)
+    def test_since_returns_only_changed_products(self):
+        Product.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+        since = timezone.now()
+        self.products[3].name = 'Renamed'
+        self.products[3].save()
+        # Saved before since, but committed after the client's last sync
+        Product.objects.filter(pk=self.products[1].pk).update(updated_at=since - timedelta(seconds=30))
+        results = self.client.get(self.url, {'since': since.isoformat()}).json()['results']
+        self.assertEqual([row['name'] for row in results], ['Item 1', 'Renamed'])
+        # A timestamp without an offset is read in the site's time zone
+        naive = timezone.localtime(since).replace(tzinfo=None).isoformat()
+        results = self.client.get(self.url, {'since': naive}).json()['results']
+        self.assertEqual([row['name'] for row in results], ['Item 1', 'Renamed'])
+
+    def test_bad_parameters_are_rejected(self):
+        for params in (
+            {'fields': 'id,cost'}, {'cursor': 'nonsense'}, {'since': 'yesterday'},
+            {'since': '2024-02-30'}, {'since': '2024-13-01T00:00:00'},
+            {'cursor': api.encode_cursor(datetime(2024, 1, 1), 1)},
+        ):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('error', response.json())
+
+    def test_unchanged_catalog_answers_304_without_queries(self):
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        self.assertFalse(etag.startswith('W/'))
+        self.assertNotIn('Last-Modified', response)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        # Another query is another representation
+        self.assertEqual(self.client.get(self.url, {'limit': 1}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products[0].save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_responses_are_compressed(self):
+        plain = self.client.get(self.url)
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(json.loads(gzip.decompress(response.content)), plain.json())
+        self.assertNotEqual(response['ETag'], plain['ETag'])
+        self.assertEqual(self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip;q=0').get('Content-Encoding'), None)
+
+
+class ProductFragmentCacheTest(TestCase):
+    def setUp(self):
+        catalog.get_cache().clear()
+        self.user = User.objects.create_user(username='testuser', password='testpassword', is_staff=True)
+        self.client.login(username='testuser', password='testpassword')
+        self.products = [
+            Product.objects.create(name=f'Item {i}', description=f'Description {i}', price='2.50') for i in range(3)
+        ]
+
+    def test_warm_list_renders_rows_from_the_cache(self):
+        self.client.get(reverse('product_list'))
+        self.assertEqual(catalog.stats(), {'hits': 0, 'misses': 3, 'hit_ratio': 0.0})
+        with mock.patch('products.views.render_to_string') as render:
+            response = self.client.get(reverse('product_list'))
+        render.assert_not_called()
+        self.assertContains(response, 'Description 1')
+        self.assertEqual(catalog.stats(), {'hits': 3, 'misses': 3, 'hit_ratio': 0.5})
+
+    def test_seeding_a_version_never_overwrites_a_bump(self):
+        cache = catalog.get_cache()
+        pk = self.products[0].pk
+        add = cache.add
+        saved = []
+
+        def bump_first(key, *args, **kwargs):
+            # Another request saves the product between our read and our seed
+            if key == catalog.product_version_key(pk) and not saved:
+                saved.append(add(key, 1, timeout=None))
+                catalog.bump_product(pk)
+            return add(key, *args, **kwargs)
+
+        with mock.patch.object(cache, 'add', side_effect=bump_first):
+            versions = catalog.get_product_versions([product.pk for product in self.products])
+        self.assertEqual(versions[pk], 2)
+        self.assertEqual(catalog.get_product_versions([product.pk for product in self.products]), versions)
+
+    def test_rows_read_before_a_save_are_not_cached_under_its_version(self):
+        catalog_version = catalog.get_version()
+        stale = list(Product.objects.order_by('pk'))
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.get(pk=self.products[1].pk)
+            product.name = 'Renamed'
+            product.save()
+        # The save committed after the rows were read, but before their versions were
+        catalog.cached_fragments('row', stale, lambda product: product.name, catalog_version)
+        fresh = Product.objects.order_by('pk')
+        self.assertEqual(
+            catalog.cached_fragments('row', fresh, lambda product: product.name, catalog.get_version()),
+            ['Item 0', 'Renamed', 'Item 2'],
+        )
+
+    def test_saving_a_product_replaces_only_its_fragments(self):
+        self.client.get(reverse('product_list'))
+        self.client.get(reverse('product_detail', args=[self.products[1].pk]))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('product_update', args=[self.products[1].pk]),
+                {'name': 'Renamed', 'description': 'New description', 'price': '3.00'},
+            )
+        response = self.client.get(reverse('product_list'))
+        self.assertContains(response, 'Renamed')
+        self.assertNotContains(response, 'Item 1')
+        self.assertEqual((catalog.stats()['hits'], catalog.stats()['misses']), (2, 5))
+        response = self.client.get(reverse('product_detail', args=[self.products[1].pk]))
+        self.assertContains(response, 'New description')
+
+    def test_detail_keeps_stock_and_csrf_out_of_the_fragment(self):
+        Product.objects.filter(pk=self.products[0].pk).update(stock=4)
+        url = reverse('product_detail', args=[self.products[0].pk])
+        self.assertContains(self.client.get(url), 'In stock: 4')
+        Product.objects.filter(pk=self.products[0].pk).update(stock=0)
+        response = self.client.get(url)
+        self.assertContains(response, 'Out of stock')
+        self.assertEqual(catalog.stats()['hits'], 1)
+
+    def test_search_results_are_not_cached(self):
+        self.client.get(reverse('product_list'), {'query': 'description'})
+        self.assertEqual(catalog.stats()['misses'], 0)
+
+    def test_stats_are_for_staff(self):
+        self.assertEqual(set(self.client.get(reverse('product_cache_stats')).json()), {'hits', 'misses', 'hit_ratio'})
+        User.objects.filter(pk=self.user.pk).update(is_staff=False)
+        self.assertEqual(self.client.get(reverse('product_cache_stats')).status_code, 302)
+
+
+class RecommendationTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.products = [
+            Product.objects.create(name=f'Item {i}', description='A test description', price='2.50') for i in range(6)
+        ]
+
+    def order(self, *indexes):
+        order = Order.objects.create(user=self.user, total_price='0.00', shipping_address='Somewhere')
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=self.products[i], quantity=1, price='2.50') for i in indexes
+        ])
+
+    def recommended(self, index):
+        return [self.products.index(product) for product in recommendations.recommended_products(self.products[index])]
+
+    def test_pairs_are_ranked_by_orders_in_common(self):
+        self.order(0, 1, 2)
+        self.order(0, 1)
+        self.order(0, 3)
+        self.order(4)
+        run = recommendations.build()
+        self.assertEqual((run.orders, run.full), (4, True))
+        self.assertEqual(self.recommended(0), [1, 2, 3])
+        self.assertEqual(self.recommended(3), [0])
+        self.assertEqual(self.recommended(4), [])
+        with self.assertNumQueries(1):
+            recommendations.recommended_products(self.products[0])
+        self.assertContains(self.client.get(reverse('product_detail', args=[self.products[3].pk])), 'Item 0')
+
+    @override_settings(PRODUCTS_RECOMMENDATION_LIMIT=2, PRODUCTS_RECOMMENDATION_CANDIDATES=2)
+    def test_counts_are_pruned_to_the_top_pairings(self):
+        for others in ((1, 2, 3, 4, 5), (1, 2), (1, 2), (1,)):
+            self.order(0, *others)
+        counts, orders = recommendations.count_pairs(0, Order.objects.latest('pk').pk)
+        self.assertEqual(counts[self.products[0].pk], {self.products[1].pk: 4, self.products[2].pk: 3})
+        recommendations.build()
+        self.assertEqual(ProductRecommendation.objects.filter(product=self.products[0]).count(), 2)
+
+    def test_incremental_runs_only_read_new_orders(self):
+        self.order(0, 1)
+        self.order(0, 2)
+        self.order(0, 2)
+        recommendations.build()
+        self.assertIsNone(recommendations.build())
+        self.order(0, 1)
+        self.order(0, 1)
+        self.order(3, 4)
+        out = StringIO()
+        call_command('build_recommendations', '--chunk-size', '1', stdout=out)
+        self.assertIn('Read 3 orders', out.getvalue())
+        self.assertIn('incremental', out.getvalue())
+        self.assertEqual(self.recommended(0), [1, 2])
+        self.assertEqual(ProductRecommendation.objects.get(product=self.products[0], recommended=self.products[1]).score, 3)
+        self.assertEqual(self.recommended(3), [4])
+        recommendations.build(full=True)
+        self.assertEqual(ProductRecommendation.objects.get(product=self.products[0], recommended=self.products[1]).score, 3)
+
+    def test_orders_committed_behind_the_watermark_are_counted_once(self):
+        self.order(0, 1)
+        self.order(0, 2)
+        self.order(3, 4)
+        # The middle order's id was handed out but it has not committed yet
+        late = Order.objects.order_by('pk')[1]
+        late_pk = late.pk
+        late.delete()
+        self.assertEqual(recommendations.build().orders, 2)
+        order = Order.objects.create(pk=late_pk, user=self.user, total_price='0.00', shipping_address='Somewhere')
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=self.products[i], quantity=1, price='2.50') for i in (0, 3)
+        ])
+        run = recommendations.build()
+        self.assertEqual((run.orders, run.full), (1, False))
+        self.assertEqual(self.recommended(0), [1, 3])
+        self.assertIsNone(recommendations.build())
+        self.order(2, 5)
+        self.assertEqual(recommendations.build().orders, 1)
+        self.assertEqual(self.recommended(3), [0, 4])
+
+
+class CartViewTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.client.login(username='testuser', password='testpassword')
+        self.cart = Cart.objects.create(user=self.user)
+
+    def fill_cart(self, count):
+        products = Product.objects.bulk_create([
+            Product(name=f'Item {i}', description='A test description', price='2.50') for i in range(count)
+        ])
+        CartItem.objects.bulk_create([CartItem(cart=self.cart, product=product, quantity=2) for product in products])
+
+    def test_cart_page_query_count_is_constant(self):
+        self.fill_cart(1)
+        # Session and user, then the cart and its lines
+        with self.assertNumQueries(4):
+            self.client.get(reverse('cart'))
+        self.fill_cart(20)
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('cart'))
+        self.assertEqual(response.context['total'], Decimal('105.00'))
+        self.assertContains(response, 'Item 19 - Quantity: 2 - Price: $5.00')
+        self.assertContains(response, 'Total: $105.00')
+
+    def test_total_price_is_aggregated(self):
+        self.fill_cart(3)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.cart.get_total_price(), Decimal('15.00'))
+        self.assertEqual(Cart.objects.create(user=User.objects.create_user(username='empty')).get_total_price(), Decimal('0.00'))
+
+
+class AddToCartConcurrencyTest(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.cart = Cart.objects.create(user=self.user)
+        self.product = Product.objects.create(name='Test Product', description='A test description', price=10.00)
+
+    def add(self, _):
+        try:
+            return add_item(self.cart.pk, self.product.pk)
+        finally:
+            connections.close_all()
+
+    def test_parallel_adds_lose_no_updates(self):
+        with ThreadPoolExecutor(max_workers=50) as pool:
+            results = list(pool.map(self.add, range(50)))
+        self.assertTrue(all(results))
+        item = CartItem.objects.get(cart=self.cart, product=self.product)
+        self.assertEqual(item.quantity, 50)
+
+
+class MaterializeOrderTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.client.login(username='testuser', password='testpassword')
+        self.cart = Cart.objects.create(user=self.user)
+
+    def fill_cart(self, count):
+        products = Product.objects.bulk_create([
+            Product(name=f'Item {i}', description='A test description', price='2.50') for i in range(count)
+        ])
+        CartItem.objects.bulk_create([CartItem(cart=self.cart, product=product, quantity=2) for product in products])
+        return products
+
+    def checkout(self, session_id):
+        lines = self.cart.get_lines()
+        token, sold_out = stock.reserve(self.user, lines)
+        record_session(session_id, lines, token)
+
+    def test_query_count_is_constant(self):
+        self.fill_cart(1)
+        self.checkout('cs_test_1')
+        with self.assertNumQueries(10):
+            materialize_order(self.user, 'cs_test_1')
+        self.fill_cart(20)
+        self.checkout('cs_test_2')
+        with self.assertNumQueries(10):
+            order, created = materialize_order(self.user, 'cs_test_2')
+        self.assertTrue(created)
+        self.assertTrue(order.is_paid)
+        self.assertEqual(order.total_price, Decimal('100.00'))
+        self.assertEqual(order.items.count(), 20)
+        self.assertFalse(self.cart.items.exists())
+
+    def test_retrying_a_session_returns_the_same_order(self):
+        self.fill_cart(2)
+        self.checkout('cs_test_1')
+        order, created = materialize_order(self.user, 'cs_test_1')
+        self.fill_cart(1)
+        with self.assertNumQueries(1):
+            again, created = materialize_order(self.user, 'cs_test_1')
+        self.assertEqual((again, created), (order, False))
+        self.assertEqual(Order.objects.count(), 1)
+        # The cart keeps what was added after the order was placed
+        self.assertEqual(self.cart.items.count(), 1)
+
+    def test_order_matches_what_the_session_charged(self):
+        (paid,) = self.fill_cart(1)
+        self.checkout('cs_test_1')
+        # Changed after paying: more of the same product, and something new at a new price
+        CartItem.objects.filter(product=paid).update(quantity=5)
+        Product.objects.filter(pk=paid.pk).update(price='99.00')
+        (unpaid,) = self.fill_cart(1)
+        order, created = materialize_order(self.user, 'cs_test_1')
+        self.assertEqual(order.total_price, Decimal('5.00'))
+        self.assertEqual(
+            list(order.items.values_list('product', 'quantity', 'price')), [(paid.pk, 2, Decimal('2.50'))]
+        )
+        self.assertEqual(
+            dict(self.cart.items.values_list('product', 'quantity')), {paid.pk: 3, unpaid.pk: 2}
+        )
+
+    def test_session_without_lines_places_no_order(self):
+        self.fill_cart(1)
+        with self.assertRaises(ValueError):
+            materialize_order(self.user, 'cs_test_unknown')
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.cart.items.count(), 1)
+
+
+class StockReservationTest(StripeStubMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.client.login(username='testuser', password='testpassword')
+        self.cart = Cart.objects.create(user=self.user)
+        self.product = Product.objects.create(name='Test Product', description='A test description', price=10.00, stock=5)
+        self.untracked = Product.objects.create(name='Gift Card', description='A test description', price=10.00)
+        CartItem.objects.create(cart=self.cart, product=self.product, quantity=3)
+        CartItem.objects.create(cart=self.cart, product=self.untracked, quantity=7)
+
+    def stock_left(self):
+        return Product.objects.get(pk=self.product.pk).stock
+
+    def test_reserve_takes_stock_and_sold_out_takes_nothing(self):
+        token, sold_out = stock.reserve(self.user, self.cart.get_lines())
+        self.assertEqual(sold_out, [])
+        self.assertEqual(self.stock_left(), 2)
+        self.assertEqual(StockReservation.objects.filter(token=token).count(), 2)
+        other = User.objects.create_user(username='otheruser')
+        token, sold_out = stock.reserve(other, self.cart.get_lines())
+        self.assertEqual((token, sold_out), (None, [self.product.pk]))
+        self.assertEqual(self.stock_left(), 2)
+        self.assertEqual(StockReservation.objects.count(), 2)
+
+    def test_checkout_reserves_and_fulfillment_converts(self):
+        response = self.client.post(reverse('checkout'))
+        self.assertEqual(response.status_code, 303)
+        session_id = response.url.rsplit('/', 1)[1]
+        self.assertEqual(self.stock_left(), 2)
+        self.assertEqual(set(StockReservation.objects.values_list('stripe_session_id', flat=True)), {session_id})
+        method, path, params = self.stripe.requests[-1]
+        self.assertGreater(int(params['expires_at']), time.time())
+
+        self.assertEqual(
+            list(CheckoutLine.objects.filter(stripe_session_id=session_id).values_list('product', 'quantity')),
+            [(self.product.pk, 3), (self.untracked.pk, 7)],
+        )
+        materialize_order(self.user, session_id)
+        self.assertFalse(StockReservation.objects.exists())
+        self.assertEqual(self.stock_left(), 2)
+
+    def test_editing_a_product_keeps_the_reserved_stock(self):
+        url = reverse('product_update', args=[self.product.pk])
+        self.assertNotContains(self.client.get(url), 'name="stock"')
+        self.client.post(reverse('checkout'))
+        self.client.post(url, {'name': 'Renamed', 'description': 'A test description', 'price': '10.00'})
+        self.assertEqual(Product.objects.get(pk=self.product.pk).name, 'Renamed')
+        self.assertEqual(self.stock_left(), 2)
+        User.objects.filter(pk=self.user.pk).update(is_staff=True, is_superuser=True)
+        admin_url = reverse('admin:products_product_change', args=[self.product.pk])
+        self.client.post(admin_url, {'name': 'Renamed again', 'description': 'A test description', 'price': '10.00'})
+        self.assertEqual(Product.objects.get(pk=self.product.pk).name, 'Renamed again')
+        self.assertEqual(self.stock_left(), 2)
+
+    def test_stock_is_adjusted_relative_to_the_current_count(self):
+        url = reverse('product_stock', args=[self.product.pk])
+        self.client.post(reverse('checkout'))
+        self.assertRedirects(self.client.post(url, {'change': 4}), reverse('product_update', args=[self.product.pk]))
+        self.assertEqual(self.stock_left(), 6)
+        self.assertContains(self.client.post(url, {'change': -7}), 'Only 6 in stock.')
+        self.assertEqual(self.stock_left(), 6)
+        self.client.post(reverse('product_stock', args=[self.untracked.pk]), {'change': 3})
+        self.assertEqual(Product.objects.get(pk=self.untracked.pk).stock, 3)
+
+    def test_checking_out_again_replaces_the_earlier_hold(self):
+        first = self.client.post(reverse('checkout')).url.rsplit('/', 1)[1]
+        # Only two units would be left if the first hold were kept
+        second = self.client.post(reverse('checkout')).url.rsplit('/', 1)[1]
+        self.assertEqual(self.stock_left(), 2)
+        self.assertEqual(set(StockReservation.objects.values_list('stripe_session_id', flat=True)), {second})
+        # The abandoned session gets paid after all: its units are taken again
+        Product.objects.filter(pk=self.product.pk).update(stock=4)
+        order, created = materialize_order(self.user, first)
+        self.assertEqual((self.stock_left(), order.stock_shortfall), (1, False))
+
+    def test_paying_after_the_hold_lapsed_takes_the_stock_again(self):
+        session_id = self.client.post(reverse('checkout')).url.rsplit('/', 1)[1]
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        stock.release_expired()
+        self.assertEqual(self.stock_left(), 5)
+        order, created = materialize_order(self.user, session_id)
+        self.assertEqual((self.stock_left(), order.stock_shortfall), (2, False))
+
+    def test_paying_after_the_units_sold_out_flags_the_order(self):
+        session_id = self.client.post(reverse('checkout')).url.rsplit('/', 1)[1]
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        stock.release_expired()
+        Product.objects.filter(pk=self.product.pk).update(stock=1)
+        order, created = materialize_order(self.user, session_id)
+        self.assertEqual((self.stock_left(), order.stock_shortfall), (1, True))
+        self.assertContains(self.client.get(reverse('order_history')), 'sold out while you were paying')
+
+    def test_sold_out_checkout_goes_back_to_the_cart(self):
+        Product.objects.filter(pk=self.product.pk).update(stock=2)
+        response = self.client.post(reverse('checkout'), follow=True)
+        self.assertRedirects(response, reverse('cart'))
+        self.assertContains(response, 'Not enough stock left for: Test Product')
+        self.assertNotIn('/v1/checkout/sessions', [path for method, path, params in self.stripe.requests])
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_failed_stripe_call_releases_the_reservation(self):
+        self.stripe.latency = 0.5
+        with override_settings(STRIPE_TIMEOUT=0.1, STRIPE_MAX_NETWORK_RETRIES=0):
+            self.assertRedirects(self.client.post(reverse('checkout')), reverse('stripe_cancel'))
+        self.assertEqual(self.stock_left(), 5)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_expired_sessions_and_reservations_are_released(self):
+        session = self.stripe.create_session({'client_reference_id': str(self.user.pk)})
+        token, sold_out = stock.reserve(self.user, self.cart.get_lines())
+        stock.attach_session(token, session['id'])
+        payload = self.stripe.event(session['id'], 'checkout.session.expired')
+        with override_settings(DJSTRIPE_WEBHOOK_SECRET='whsec_test'):
+            self.client.post(
+                reverse('stripe_webhook'), payload, content_type='application/json',
+                HTTP_STRIPE_SIGNATURE=signature_header(payload, 'whsec_test'),
+            )
+        self.assertEqual(self.stock_left(), 5)
+        self.assertFalse(FulfillmentJob.objects.exists())
+
+        stock.reserve(self.user, self.cart.get_lines())
+        stock.reserve(User.objects.create_user(username='otheruser'), [CartItem(product=self.product, quantity=1)])
+        self.assertEqual(stock.release_expired(), 0)
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        out = StringIO()
+        call_command('release_expired_reservations', '--once', '--batch-size', '2', stdout=out)
+        self.assertEqual(out.getvalue().count('Released'), 2)
+        self.assertEqual(self.stock_left(), 5)
+        self.assertFalse(StockReservation.objects.exists())
+
+
+class StockConcurrencyTest(TransactionTestCase):
+    def setUp(self):
+        self.product = Product.objects.create(name='Test Product', description='A test description', price=10.00, stock=10)
+        self.users = User.objects.bulk_create([User(username=f'buyer{i}') for i in range(30)])
+
+    def buy(self, user):
+        try:
+            while True:
+                try:
+                    token, sold_out = stock.reserve(user, [CartItem(product=self.product, quantity=1)])
+                    return not sold_out
+                except OperationalError:
+                    # The in-memory test database reports a locked table at once
+                    # instead of waiting on the busy timeout like a database file
+                    time.sleep(0.01)
+        finally:
+            connections.close_all()
+
+    def test_parallel_buyers_never_oversell(self):
+        with ThreadPoolExecutor(max_workers=30) as pool:
+            results = list(pool.map(self.buy, self.users))
+        self.assertEqual(results.count(True), 10)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock, 0)
+        self.assertEqual(StockReservation.objects.count(), 10)
+
+
+@override_settings(DJSTRIPE_WEBHOOK_SECRET='whsec_test', FULFILLMENT_MAX_ATTEMPTS=2)
+class FulfillmentTest(StripeStubMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.client.login(username='testuser', password='testpassword')
+        cart = Cart.objects.create(user=self.user)
+        product = Product.objects.create(name='Test Product', description='A test description', price=10.00)
+        CartItem.objects.create(cart=cart, product=product, quantity=3)
+        self.session = self.stripe.create_session({'client_reference_id': str(self.user.pk)})
+        record_session(self.session['id'], cart.get_lines())
+
+    def send_webhook(self, payload, secret='whsec_test'):
+        return self.client.post(
+            reverse('stripe_webhook'), payload, content_type='application/json',
+            HTTP_STRIPE_SIGNATURE=signature_header(payload, secret),
+        )
+
+    def success_page(self):
+        return self.client.get(reverse('stripe_success'), {'session_id': self.session['id']})
+
+    def test_webhook_queues_fulfillment_once(self):
+        payload = self.stripe.event(self.session['id'])
+        self.assertEqual(self.send_webhook(payload).status_code, 200)
+        self.assertEqual(self.send_webhook(payload).status_code, 200)
+        job = FulfillmentJob.objects.get()
+        self.assertEqual((job.stripe_session_id, job.user, job.status), (self.session['id'], self.user, 'pending'))
+        self.assertFalse(Order.objects.exists())
+
+    def test_webhook_rejects_bad_signatures_and_ignores_unpaid_sessions(self):
+        payload = self.stripe.event(self.session['id'])
+        self.assertEqual(self.send_webhook(payload, secret='whsec_wrong').status_code, 400)
+        self.stripe.payment_status = 'unpaid'
+        self.assertEqual(self.send_webhook(self.stripe.event(self.session['id'])).status_code, 200)
+        self.assertFalse(FulfillmentJob.objects.exists())
+
+    def test_success_page_is_a_status_lookup(self):
+        with self.assertNumQueries(4):
+            response = self.success_page()
+        self.assertContains(response, 'being placed')
+        self.send_webhook(self.stripe.event(self.session['id']))
+        self.assertContains(self.success_page(), 'being placed')
+        self.assertEqual(fulfillment.work(), (1, 0))
+        self.assertRedirects(self.success_page(), reverse('order_history'))
+        # None of this reached Stripe
+        self.assertEqual(len(self.stripe.requests), 0)
+        order = Order.objects.get()
+        self.assertEqual((order.total_price, order.is_paid), (Decimal('30.00'), True))
+        self.assertEqual(FulfillmentJob.objects.get().status, 'done')
+
+    def test_failed_jobs_are_retried_with_backoff_then_given_up(self):
+        self.send_webhook(self.stripe.event(self.session['id']))
+        with mock.patch('products.fulfillment.materialize_order', side_effect=RuntimeError('database away')):
+            self.assertEqual(fulfillment.work(), (0, 1))
+            job = FulfillmentJob.objects.get()
+            self.assertEqual((job.status, job.attempts, job.last_error), ('pending', 1, 'RuntimeError: database away'))
+            self.assertGreater(job.run_after, timezone.now())
+            # Not due yet
+            self.assertEqual(fulfillment.work(), (0, 0))
+            FulfillmentJob.objects.update(run_after=timezone.now())
+            self.assertEqual(fulfillment.work(), (0, 1))
+        self.assertEqual(FulfillmentJob.objects.get().status, 'failed')
+        self.assertContains(self.success_page(), 'We Could Not Place Your Order')
+
+    def test_sessions_without_recorded_lines_are_not_fulfilled(self):
+        session = self.stripe.create_session({'client_reference_id': str(self.user.pk)})
+        self.send_webhook(self.stripe.event(session['id']))
+        self.assertEqual(fulfillment.work(), (0, 1))
+        job = FulfillmentJob.objects.get()
+        self.assertIn('No checkout lines', job.last_error)
+        self.assertFalse(Order.objects.exists())
+
+    def test_claimed_jobs_are_leased(self):
+        self.send_webhook(self.stripe.event(self.session['id']))
+        self.assertEqual(len(fulfillment.claim(10)), 1)
+        self.assertEqual(fulfillment.claim(10), [])
+        FulfillmentJob.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(len(fulfillment.claim(10)), 1)
+
+    def test_worker_command_drains_the_queue(self):
+        self.send_webhook(self.stripe.event(self.session['id']))
+        out = StringIO()
+        call_command('fulfillment_worker', '--once', stdout=out)
+        self.assertIn('Fulfilled 1 orders, 0 failed.', out.getvalue())
+        self.assertTrue(Order.objects.filter(stripe_session_id=self.session['id']).exists())
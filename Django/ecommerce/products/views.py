@@ -1,37 +1,131 @@
+import logging
+from decimal import Decimal
+
 import stripe
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, HttpResponseRedirect, JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
 from django.views.generic import ListView, DetailView
+from django.contrib import messages
 from django.contrib.auth import login
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q # Import Q object for complex lookups
-from django.db import transaction # Import transaction
-from djstripe.models import Customer # Import Customer model
-from .models import Product, Cart, CartItem, Order, OrderItem # Import Order and OrderItem
-from .forms import CustomUserCreationForm, SearchForm, ProductForm, CheckoutForm # Import CheckoutForm
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from django.db.models import Prefetch
+from django.core.paginator import Paginator
+from django.db.models.functions import Substr
+from .models import Product, Cart, Order, OrderItem, FulfillmentJob # Import Order and OrderItem
+from .cart import add_item
+from .checkout import record_session
+from .pagination import PAGINATORS
+from .payments import create_checkout_session, create_customer, stripe_client
+from .recommendations import recommended_products
+from .search import search_products
+from . import autocomplete, catalog, fulfillment, stock
+from .forms import CustomUserCreationForm, SearchForm, ProductForm, NewProductForm, StockForm, CheckoutForm # Import CheckoutForm
+
+logger = logging.getLogger(__name__)
 
 class ProductListView(ListView):
     model = Product
     template_name = 'products/product_list.html'
     context_object_name = 'products'
 
+    def get(self, request, *args, **kwargs):
+        # Before any row is read, so cached_fragments can tell whether one changed since
+        self.catalog_version = catalog.get_version()
+        return super().get(request, *args, **kwargs)
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['search_form'] = SearchForm()
+        context['search_form'] = SearchForm(initial={'query': self.search_query})
+        context['search_query'] = self.search_query
+        context['rows'] = self.render_rows(context['products'])
         return context
 
+    def render_row(self, product):
+        return render_to_string('products/_product_row.html', {
+            'product': product,
+            'search_query': self.search_query,
+            'excerpt_length': settings.PRODUCTS_EXCERPT_LENGTH,
+        })
+
+    def render_rows(self, products):
+        products = list(products)
+        if self.search_query:
+            # Highlighting depends on the query, so search results are rendered every time
+            return [self.render_row(product) for product in products]
+        return catalog.cached_fragments('row', products, self.render_row, self.catalog_version)
+
+    @property
+    def search_query(self):
+        return self.request.GET.get('query', '').strip()
+
+    def get_paginate_by(self, queryset):
+        try:
+            page_size = int(self.request.GET.get('page_size', settings.PRODUCTS_PAGE_SIZE))
+        except ValueError:
+            page_size = settings.PRODUCTS_PAGE_SIZE
+        return min(max(page_size, 1), settings.PRODUCTS_MAX_PAGE_SIZE)
+
+    def get_paginator(self, queryset, per_page, **kwargs):
+        paginator_class = PAGINATORS[settings.PRODUCTS_COUNT_STRATEGY]
+        return paginator_class(queryset, per_page, **kwargs)
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.search_query:
+            return super().paginate_queryset(queryset, page_size)
+        # Search results come from the ranked index rather than the list queryset
+        try:
+            page_number = int(self.request.GET.get('page') or 1)
+        except ValueError:
+            raise Http404('Invalid page.')
+        if page_number < 1:
+            raise Http404('Invalid page.')
+        results = search_products(self.search_query, page_number, page_size)
+        return (None, results, results.object_list, results.has_other_pages())
+
     def get_queryset(self):
-        queryset = super().get_queryset()
-        query = self.request.GET.get('query')
-        if query:
-            queryset = queryset.filter(Q(name__icontains=query) | Q(description__icontains=query))
-        return queryset
+        # One character past the limit lets the template tell whether to add an ellipsis
+        return (
+            super().get_queryset()
+            .defer('description')
+            .annotate(excerpt=Substr('description', 1, settings.PRODUCTS_EXCERPT_LENGTH + 1))
+            .order_by('pk')
+        )
+
+def product_autocomplete(request):
+    try:
+        limit = int(request.GET.get('limit', settings.PRODUCTS_AUTOCOMPLETE_LIMIT))
+    except ValueError:
+        limit = settings.PRODUCTS_AUTOCOMPLETE_LIMIT
+    limit = min(max(limit, 1), settings.PRODUCTS_AUTOCOMPLETE_LIMIT)
+    matches = autocomplete.index.complete(request.GET.get('q', ''), limit)
+    return JsonResponse({'results': [{'pk': pk, 'name': name} for pk, name in matches]})
 
 class ProductDetailView(DetailView):
     model = Product
     template_name = 'products/product_detail.html'
     context_object_name = 'product'
 
+    def get(self, request, *args, **kwargs):
+        self.catalog_version = catalog.get_version()
+        return super().get(request, *args, **kwargs)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        (context['fragment'],) = catalog.cached_fragments(
+            'detail', [self.object], self.render_fragment, self.catalog_version,
+        )
+        context['recommendations'] = recommended_products(self.object)
+        return context
+
+    def render_fragment(self, product):
+        return render_to_string('products/_product_detail.html', {'product': product})
+
 def register(request):
     if request.method == 'GET':
         form = CustomUserCreationForm()
@@ -44,28 +138,33 @@ def register(request):
             return redirect('product_list')
         return render(request, 'registration/register.html', {'form': form})
 
+@staff_member_required
+def cache_stats(request):
+    return JsonResponse(catalog.stats())
+
 @login_required
 def add_to_cart(request, pk):
-    product = get_object_or_404(Product, pk=pk)
     cart, created = Cart.objects.get_or_create(user=request.user)
-    cart_item, created = CartItem.objects.get_or_create(cart=cart, product=product)
-    if not created:
-        cart_item.quantity += 1
-        cart_item.save()
+    if not add_item(cart.pk, pk):
+        raise Http404('No product matches the given query.')
     return redirect('product_list')
 
 @login_required
 def cart_view(request):
     cart, created = Cart.objects.get_or_create(user=request.user)
-    return render(request, 'products/cart.html', {'cart': cart})
+    lines = cart.get_lines()
+    # Summing the fetched lines saves the separate aggregate query. SQLite drops
+    # trailing zeros from computed decimals, so the template formats the amounts
+    total = sum((line.line_total for line in lines), Decimal('0.00'))
+    return render(request, 'products/cart.html', {'cart': cart, 'lines': lines, 'total': total})
 
 @login_required
 def product_create(request):
     if request.method == 'GET':
-        form = ProductForm()
+        form = NewProductForm()
         return render(request, 'products/product_form.html', {'form': form})
     elif request.method == 'POST':
-        form = ProductForm(request.POST)
+        form = NewProductForm(request.POST)
         if form.is_valid():
             form.save()
             return redirect('product_list')
@@ -76,83 +175,109 @@ def product_update(request, pk):
     product = get_object_or_404(Product, pk=pk)
     if request.method == 'GET':
         form = ProductForm(instance=product)
-        return render(request, 'products/product_form.html', {'form': form})
+        return render(request, 'products/product_form.html', {'form': form, 'stock_form': StockForm()})
     elif request.method == 'POST':
         form = ProductForm(request.POST, instance=product)
         if form.is_valid():
-            form.save()
+            # Leaves stock as the reservations left it, not as it was when the product was loaded
+            form.save(commit=False).save(update_fields=[*form.Meta.fields, 'updated_at'])
             return redirect('product_list')
-        return render(request, 'products/product_form.html', {'form': form})
+        return render(request, 'products/product_form.html', {'form': form, 'stock_form': StockForm()})
 
 @login_required
-def checkout_view(request):
-    stripe.api_key = settings.STRIPE_SECRET_KEY
-    cart, created = Cart.objects.get_or_create(user=request.user)
-    customer, created = Customer.get_or_create(subscriber=request.user)
-    if not cart.items.exists():
+@require_POST
+def product_stock(request, pk):
+    product = get_object_or_404(Product, pk=pk)
+    stock_form = StockForm(request.POST)
+    if stock_form.is_valid():
+        if stock.adjust(product.pk, stock_form.cleaned_data['change']):
+            return redirect('product_update', pk=product.pk)
+        product.refresh_from_db(fields=['stock'])
+        stock_form.add_error('change', f"Only {product.stock or 0} in stock.")
+    form = ProductForm(instance=product)
+    return render(request, 'products/product_form.html', {'form': form, 'stock_form': stock_form})
+
+@login_required
+async def checkout_view(request):
+    user = await request.auser()
+    cart, created = await Cart.objects.aget_or_create(user=user)
+    lines = await sync_to_async(cart.get_lines)()
+    if not lines:
         return redirect('cart') # Redirect to cart if empty
 
     if request.method == 'POST':
-        # Create Stripe Checkout Session
-        checkout_session = stripe.checkout.Session.create(
-            line_items=[
-                {
-                    'price_data': {
-                        'currency': 'usd',
-                        'product_data': {
-                            'name': item.product.name,
-                        },
-                        'unit_amount': int(item.product.price * 100), # Stripe expects amount in cents
-                    },
-                    'quantity': item.quantity,
-                } for item in cart.items.all()
-            ],
-            mode='payment',
-            success_url=request.build_absolute_uri('/products/stripe_success?session_id={CHECKOUT_SESSION_ID}'),
-            cancel_url=request.build_absolute_uri('/products/stripe_cancel'),
-        )
-        return redirect(checkout_session.url, code=303)
+        # One client for both Stripe calls, so they share a connection
+        async with stripe_client():
+            if not user.stripe_customer_id:
+                # Only the first checkout pays for this round trip; the page view never does
+                try:
+                    await create_customer(user)
+                except stripe.error.StripeError:
+                    # Checkout works without one, and sync_stripe_customers catches the user up
+                    logger.warning('Could not create a Stripe customer for user %s', user.pk, exc_info=True)
+            token, sold_out = await sync_to_async(stock.reserve)(user, lines)
+            if sold_out:
+                names = ', '.join(line.product.name for line in lines if line.product_id in sold_out)
+                await sync_to_async(messages.error)(request, f"Not enough stock left for: {names}")
+                return redirect('cart')
+            # Create Stripe Checkout Session
+            try:
+                checkout_session = await create_checkout_session(
+                    lines,
+                    success_url=request.build_absolute_uri('/products/stripe_success?session_id={CHECKOUT_SESSION_ID}'),
+                    cancel_url=request.build_absolute_uri('/products/stripe_cancel'),
+                    client_reference_id=str(user.pk),
+                    customer=user.stripe_customer_id,
+                )
+            except stripe.error.StripeError:
+                # Includes timeouts, so a slow Stripe cannot hold the request open
+                logger.exception('Could not create a Stripe checkout session for user %s', user.pk)
+                await sync_to_async(stock.release)(token=token)
+                return redirect('stripe_cancel')
+        await sync_to_async(record_session)(checkout_session.id, lines, token)
+        # redirect() has no 303 option; See Other tells the browser to GET the Stripe page
+        response = HttpResponseRedirect(checkout_session.url)
+        response.status_code = 303
+        return response
     
     form = CheckoutForm() # For GET request or if POST fails
-    return render(request, 'products/checkout.html', {'form': form, 'cart': cart, 'stripe_publishable_key': settings.STRIPE_PUBLISHABLE_KEY})
+    total = sum((line.line_total for line in lines), Decimal('0.00'))
+    return render(request, 'products/checkout.html', {'form': form, 'cart': cart, 'lines': lines, 'total': total, 'stripe_publishable_key': settings.STRIPE_PUBLISHABLE_KEY})
 
 @login_required
 def order_history_view(request):
-    orders = Order.objects.filter(user=request.user).order_by('-created_at')
-    return render(request, 'products/order_history.html', {'orders': orders})
+    items = OrderItem.objects.select_related('product').only('order_id', 'quantity', 'price', 'product__name')
+    orders = (
+        Order.objects.filter(user=request.user)
+        .order_by('-created_at', '-pk')
+        .prefetch_related(Prefetch('items', queryset=items))
+    )
+    page = Paginator(orders, 10).get_page(request.GET.get('page'))
+    return render(request, 'products/order_history.html', {'orders': page, 'page_obj': page})
+
+@csrf_exempt
+@require_POST
+def stripe_webhook(request):
+    try:
+        event = stripe.Webhook.construct_event(
+            request.body, request.headers.get('Stripe-Signature', ''), settings.DJSTRIPE_WEBHOOK_SECRET
+        )
+    except (ValueError, stripe.error.SignatureVerificationError):
+        return HttpResponseBadRequest()
+    # Only queue the work, so Stripe gets its answer straight away
+    fulfillment.handle_event(event)
+    return HttpResponse(status=200)
 
 @login_required
 def stripe_success_view(request):
-    stripe.api_key = settings.STRIPE_SECRET_KEY
     session_id = request.GET.get('session_id')
-    if session_id:
-        try:
-            checkout_session = stripe.checkout.Session.retrieve(session_id)
-            if checkout_session.payment_status == 'paid':
-                cart = get_object_or_404(Cart, user=request.user)
-                with transaction.atomic():
-                    order = Order.objects.create(
-                        user=request.user,
-                        total_price=cart.get_total_price(),
-                        shipping_address="Stripe Checkout" # Address will be handled by Stripe
-                    )
-                    for item in cart.items.all():
-                        OrderItem.objects.create(
-                            order=order,
-                            product=item.product,
-                            quantity=item.quantity,
-                            price=item.product.price
-                        )
-                    cart.items.all().delete() # Clear the cart
-                return redirect('order_history')
-            else:
-                # Payment not successful, redirect to cancel or checkout
-                return redirect('stripe_cancel')
-        except stripe.error.StripeError as e:
-            # Handle Stripe API errors
-            print(f"Stripe error: {e}")
-            return redirect('stripe_cancel')
-    return redirect('product_list') # Fallback
+    if not session_id:
+        return redirect('product_list') # Fallback
+    # The order is placed by the fulfillment worker once Stripe's webhook arrives
+    if Order.objects.filter(user=request.user, stripe_session_id=session_id).exists():
+        return redirect('order_history')
+    job = FulfillmentJob.objects.filter(user=request.user, stripe_session_id=session_id).only('status').first()
+    return render(request, 'products/order_processing.html', {'job': job})
 
 @login_required
 def stripe_cancel_view(request):
@@ -7,6 +7,8 @@ class User(AbstractUser):
     city = models.CharField(max_length=100, blank=True, null=True)
     state = models.CharField(max_length=100, blank=True, null=True)
     zip_code = models.CharField(max_length=20, blank=True, null=True)
+    # Filled in the background on first checkout, or by `manage.py sync_stripe_customers`
+    stripe_customer_id = models.CharField(max_length=255, blank=True, null=True, unique=True)
 
     def __str__(self):
         return self.username
\ No newline at end of file